@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# http_trace.py – HTTP-Verkehr aufzeichnen (geschwärzt) und offline mit echten Latenzen abspielen
+import argparse
+import contextlib
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path, PurePosixPath
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+import upload
+
+TRACE_VERSION = 1
+PLACEHOLDER = "{{BASE}}"
+
+# Alles, was nach Zugangsdaten aussieht, wird nie gespeichert
+_SECRET_RE = re.compile(r"signature|credential|token|jwt|password|secret|session|security|accesskey", re.I)
+# Schlüssel (JSON und Query), deren Wert ein Dateiname bzw. -pfad des Benutzers ist
+_NAME_KEYS = {"name", "filename", "displayname", "x-amz-meta-name", "x-amz-meta-path"}
+_KEEP_HEADERS = ("Content-Type", "Accept-Ranges", "Content-Range")
+
+
+# ---------- Schwärzen ----------
+def _pseudonym(name: str) -> str:
+    """Dateinamen ersetzen, Endung behalten (sie bestimmt den MIME-Type)."""
+    suffix = PurePosixPath(name).suffix
+    return "n-" + hashlib.sha256(name.encode("utf-8")).hexdigest()[:10] + suffix
+
+
+def _redact_value(key, value: str) -> str:
+    if _SECRET_RE.search(key):
+        return "REDACTED"
+    if key.lower() in _NAME_KEYS:
+        return _pseudonym(value)
+    return value
+
+
+def redact_url(url: str) -> str:
+    """Host → Platzhalter, geheime Query-Werte schwärzen, Dateinamen pseudonymisieren."""
+    u = urlparse(url)
+    query = [(k, _redact_value(k, v)) for k, v in parse_qsl(u.query, keep_blank_values=True)]
+    path = u.path
+    if u.scheme and u.netloc:
+        return PLACEHOLDER + urlunparse(("", "", path, "", urlencode(query), ""))
+    return urlunparse(("", "", path, "", urlencode(query), ""))
+
+
+def redact_json(obj, key=None):
+    if isinstance(obj, dict):
+        return {k: redact_json(v, k) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [redact_json(v, key) for v in obj]
+    if isinstance(obj, str):
+        if key and (_SECRET_RE.search(key) or key.lower() in _NAME_KEYS):
+            return _redact_value(key, obj)
+        if obj.startswith(("http://", "https://")):
+            return redact_url(obj)
+    return obj
+
+
+# ---------- Aufzeichnen ----------
+class TraceRecorder:
+    """
+    requests-Response-Hook, der pro Request eine JSON-Zeile schreibt: Methode, Pfad, Status,
+    Größen und Zeiten. Keine Cookies, keine Formulardaten, HTML nur als Größe + Merkmale.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.fh = open(self.path, "w", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.t0 = time.time()
+        self._write({"trace": TRACE_VERSION, "started": round(self.t0, 3)})
+
+    def _write(self, rec):
+        with self.lock:
+            self.fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self.fh.flush()
+
+    def hook(self, r, *args, **kwargs):
+        req = r.request
+        body_ms = None
+        resp_bytes = r.headers.get("Content-Length")
+        rec_body = None
+        html = None
+        ctype = r.headers.get("Content-Type", "")
+        if not kwargs.get("stream"):
+            # Body jetzt lesen, um die Übertragungszeit zu messen (requests würde es ohnehin tun)
+            t = time.perf_counter()
+            content = r.content
+            body_ms = round((time.perf_counter() - t) * 1000, 2)
+            resp_bytes = len(content)
+            if "application/json" in ctype:
+                try:
+                    rec_body = redact_json(r.json())
+                except ValueError:
+                    pass
+            elif "text/html" in ctype:
+                html = {
+                    "csrf": b"csrfToken" in content,
+                    "login": b"Login - Schul-Cloud" in content,
+                }
+        req_body = req.body
+        headers = {k: r.headers[k] for k in _KEEP_HEADERS if k in r.headers}
+        if "Location" in r.headers:
+            headers["Location"] = redact_url(r.headers["Location"])
+        cookies = [c.name for c in r.cookies]
+        self._write({
+            "t": round(time.time() - self.t0 - r.elapsed.total_seconds(), 4),
+            "method": req.method,
+            "path": urlparse(req.url).path,
+            "status": r.status_code,
+            "req_bytes": len(req_body) if req_body is not None and hasattr(req_body, "__len__") else 0,
+            "resp_bytes": int(resp_bytes) if resp_bytes is not None else None,
+            "elapsed_ms": round(r.elapsed.total_seconds() * 1000, 2),
+            "body_ms": body_ms,
+            "headers": headers,
+            "cookies": cookies,
+            "html": html,
+            "json": rec_body,
+        })
+        return r
+
+    def close(self):
+        with self.lock:
+            self.fh.close()
+
+
+def start_recording(path) -> TraceRecorder:
+    rec = TraceRecorder(path)
+    upload.RESPONSE_HOOKS.append(rec.hook)
+    return rec
+
+
+def stop_recording(rec: TraceRecorder):
+    try:
+        upload.RESPONSE_HOOKS.remove(rec.hook)
+    except ValueError:
+        pass
+    rec.close()
+
+
+def load_trace(path):
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0].get("trace") != TRACE_VERSION:
+        raise ValueError(f"Keine Trace-Datei (Version {TRACE_VERSION}): {path}")
+    return lines[1:]
+
+
+# ---------- Abspielen ----------
+def _fill(obj, base):
+    if isinstance(obj, dict):
+        return {k: _fill(v, base) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_fill(v, base) for v in obj]
+    if isinstance(obj, str) and obj.startswith(PLACEHOLDER):
+        return base + obj[len(PLACEHOLDER):]
+    return obj
+
+
+def _fake_html(size, csrf, login):
+    head = b"<html><head>"
+    if login:
+        head += b"<title>Login - Schul-Cloud</title>"
+    if csrf:
+        head += b'<meta name="csrfToken" content="replay-csrf">'
+    head += b"</head><body>"
+    tail = b"</body></html>"
+    pad = max(0, (size or 0) - len(head) - len(tail))
+    return head + b" " * pad + tail
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Spielt eine Trace lokal ab. Antworten werden pro (Methode, Pfad) der Reihe nach (zyklisch)
+    ausgeliefert, mit der aufgezeichneten Latenz bis zu den Headern und der Übertragungsdauer.
+    Unbekannte Pfade fallen auf (Methode, erstes Pfadsegment) zurück.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, exchanges, addr=("127.0.0.1", 0), speed=1.0):
+        super().__init__(addr, _ReplayHandler)
+        self.speed = speed
+        self.base = f"http://{self.server_address[0]}:{self.server_address[1]}"
+        self.exact = defaultdict(list)
+        self.prefix = defaultdict(list)
+        for ex in exchanges:
+            self.exact[(ex["method"], ex["path"])].append(ex)
+            self.prefix[(ex["method"], self._prefix(ex["path"]))].append(ex)
+        self._next = defaultdict(int)
+        self._lock = threading.Lock()
+        self.served = 0
+        self.missed = 0
+
+    @staticmethod
+    def _prefix(path):
+        parts = [p for p in path.split("/") if p]
+        return "/" + parts[0] if parts else "/"
+
+    def pick(self, method, path):
+        key = (method, path)
+        pool = self.exact.get(key)
+        if not pool:
+            key = ("prefix", method, self._prefix(path))
+            pool = self.prefix.get(key[1:])
+        with self._lock:
+            if not pool:
+                self.missed += 1
+                return None
+            i = self._next[key]
+            self._next[key] = i + 1
+            self.served += 1
+            return pool[i % len(pool)]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _handle(self):
+        n = int(self.headers.get("Content-Length") or 0)
+        if n:
+            self.rfile.read(n)
+        srv = self.server
+        ex = srv.pick(self.command, urlparse(self.path).path)
+        if ex is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if ex.get("json") is not None:
+            body = json.dumps(_fill(ex["json"], srv.base)).encode("utf-8")
+        elif ex.get("html") is not None:
+            body = _fake_html(ex.get("resp_bytes"), ex["html"]["csrf"], ex["html"]["login"])
+        else:
+            body = b"\0" * (ex.get("resp_bytes") or 0)
+
+        time.sleep(ex.get("elapsed_ms", 0) / 1000.0 / srv.speed)
+        self.send_response(ex["status"])
+        for k, v in ex.get("headers", {}).items():
+            self.send_header(k, _fill(v, srv.base))
+        for name in ex.get("cookies", []):
+            self.send_header("Set-Cookie", f"{name}=replay; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "HEAD" or not body:
+            return
+        # Body in Stücken, damit die aufgezeichnete Übertragungsdauer nachgestellt wird
+        body_s = (ex.get("body_ms") or 0) / 1000.0 / srv.speed
+        pieces = 8 if body_s > 0.005 and len(body) > 8 else 1
+        step = -(-len(body) // pieces)
+        for i in range(0, len(body), step):
+            self.wfile.write(body[i:i + step])
+            if pieces > 1:
+                time.sleep(body_s / pieces)
+
+    do_GET = do_POST = do_PUT = do_HEAD = do_DELETE = _handle
+
+
+# ---------- Benchmark ----------
+def bench(trace_path, workers=2, speed=1.0, limit=None):
+    """
+    Spielt die Trace ab und lädt Dateien mit den aufgezeichneten Upload-Größen über den
+    echten Code-Pfad (Login → INIT → PUT → fileModel) hoch. Gibt Kennzahlen zurück.
+    Enthält die Trace keinen Login (Lauf mit Session-Cache), wird auch beim Abspielen keiner gemacht.
+    Traces von `upload.py --record-trace` (alter Login, INIT ohne signedUrl) laufen über denselben Pfad.
+    """
+    from sync_core import upload_files
+
+    exchanges = load_trace(trace_path)
+    sizes = [ex["req_bytes"] for ex in exchanges if ex["method"] == "PUT"]
+    seen = {(ex["method"], ex["path"].rstrip("/") or "/") for ex in exchanges}
+    full_login = ("POST", "/login") in seen
+    login_mode = "cached" if not full_login else "full" if ("GET", "/login") in seen else "legacy"
+    if limit:
+        sizes = sizes[:limit]
+    srv = ReplayServer(exchanges, speed=speed).start()
+    old = upload.BASE, upload.API_BASE
+    upload.BASE = upload.API_BASE = srv.base
+    try:
+        with tempfile.TemporaryDirectory(prefix="brb-bench-") as tmp:
+            files = []
+            for i, size in enumerate(sizes):
+                p = Path(tmp) / f"file_{i:04d}.bin"
+                with open(p, "wb") as f:
+                    f.truncate(size)
+                files.append(p)
+
+            t0 = time.perf_counter()
+            if login_mode == "full":
+                session = upload.create_session("replay", "replay", use_cache=False)
+            elif login_mode == "legacy":
+                # Aufgezeichnet mit upload.py (alter Ablauf: GET /, POST /login, GET /dashboard)
+                session = upload.CloudSession("replay", "replay", use_cache=False)
+                with contextlib.redirect_stdout(sys.stderr):
+                    upload.login(session, "replay", "replay")
+            else:
+                # wie beim aufgezeichneten Lauf: Cookies aus dem Cache, kein Login-Request
+                session = upload.CloudSession("replay", "replay", use_cache=False)
+            t_login = time.perf_counter() - t0
+            with session:
+                ok, fail = upload_files(session, files, workers=workers)
+            total = time.perf_counter() - t0
+    finally:
+        upload.BASE, upload.API_BASE = old
+        srv.shutdown()
+        srv.server_close()
+
+    return {
+        "trace": str(trace_path),
+        "files": len(files),
+        "bytes": sum(sizes),
+        "workers": workers,
+        "speed": speed,
+        "ok": ok,
+        "fail": fail,
+        "login": login_mode,
+        "login_s": round(t_login, 3),
+        "total_s": round(total, 3),
+        "requests": srv.served,
+        "unmatched": srv.missed,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Brandenburg Cloud: HTTP-Trace abspielen / benchmarken")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("serve", help="Trace als lokalen Server abspielen (BRB_BASE/BRB_API_BASE darauf setzen)")
+    sp.add_argument("trace")
+    sp.add_argument("--port", type=int, default=0)
+    sp.add_argument("--speed", type=float, default=1.0, help="Latenzen durch diesen Faktor teilen")
+
+    bp = sub.add_parser("bench", help="upload.py gegen die Trace messen")
+    bp.add_argument("trace")
+    bp.add_argument("--workers", type=int, default=2)
+    bp.add_argument("--speed", type=float, default=1.0, help="Latenzen durch diesen Faktor teilen")
+    bp.add_argument("--limit", type=int, default=None, help="Höchstens so viele Dateien")
+    bp.add_argument("--baseline", default=None, help="Frühere bench-Ausgabe (JSON) zum Vergleich")
+    bp.add_argument("--tolerance", type=float, default=0.10,
+                    help="Erlaubte Verlangsamung gegenüber --baseline (default: 0.10 = 10%%)")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        srv = ReplayServer(load_trace(args.trace), ("127.0.0.1", args.port), speed=args.speed)
+        print(f"Replay läuft: BRB_BASE={srv.base} BRB_API_BASE={srv.base}", file=sys.stderr)
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        result = bench(args.trace, workers=max(1, args.workers), speed=args.speed, limit=args.limit)
+    except (Exception, SystemExit) as e:
+        # z. B. Requests, die in der Trace fehlen (Replay antwortet 404)
+        msg = "Login fehlgeschlagen" if isinstance(e, SystemExit) else str(e)
+        print(f"Fehler: Abspielen fehlgeschlagen: {msg}", file=sys.stderr)
+        return 1
+    rc = 0 if result["fail"] == 0 else 1
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        result["baseline_s"] = base["total_s"]
+        result["ratio"] = round(result["total_s"] / base["total_s"], 3) if base["total_s"] else None
+        if result["ratio"] and result["ratio"] > 1.0 + args.tolerance:
+            rc = 2
+    print(json.dumps(result, ensure_ascii=False))
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# prefetch.py – Quelldateien vorab lesen, während Uploads laufen (für USB-HDDs / Netzlaufwerke)
+import os
+import threading
+from collections import deque
+from pathlib import Path
+
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+
+def order_by_locality(files):
+    """
+    Sortiert nach (Gerät, Inode). Auf ext4/xfs liegen Inodes grob in Anlage-Reihenfolge
+    auf der Platte, das spart Kopfbewegungen gegenüber der alphabetischen Reihenfolge.
+    """
+    keyed = []
+    for p in files:
+        try:
+            st = os.stat(p)
+            keyed.append(((st.st_dev, st.st_ino), p))
+        except OSError:
+            keyed.append(((0, 0), p))
+    keyed.sort(key=lambda t: t[0])
+    return [p for _, p in keyed]
+
+
+def _will_need(path):
+    """Read-ahead anstoßen, ohne selbst zu lesen."""
+    if not _HAS_FADVISE:
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_file(path) -> bytes:
+    with open(path, "rb") as f:
+        if _HAS_FADVISE:
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        data = f.read()
+        if _HAS_FADVISE:
+            # Inhalt liegt jetzt im Puffer → Page-Cache nicht doppelt belegen
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+    return data
+
+
+class Prefetcher:
+    """
+    Liest Dateien in einem Hintergrund-Thread der Reihe nach in einen begrenzten Puffer.
+
+    Iteration liefert (path, data); data ist None, wenn die Datei größer als der Puffer ist
+    oder nicht gelesen werden konnte (der Upload liest dann selbst und meldet den Fehler).
+    Nach dem Upload muss release(len(data)) den Platz wieder freigeben.
+    Für die nächsten `lookahead` Dateien wird POSIX_FADV_WILLNEED gesetzt, damit der Kernel
+    schon liest, während die aktuelle Datei noch kopiert wird.
+    """
+
+    _END = object()
+
+    def __init__(self, files, max_bytes=64 * 1024 * 1024, lookahead=4):
+        self.max_bytes = max_bytes
+        self.lookahead = lookahead
+        self._files = iter(files)
+        self._incoming = deque()     # vom Zubringer-Thread schon geholte Pfade
+        self._source_done = False
+        self._ready = deque()
+        self._used = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        threading.Thread(target=self._pull, daemon=True).start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # ---- Zubringer ----
+    def _pull(self):
+        """
+        Holt Pfade aus der Quelle. Die Quelle darf blockieren (z. B. Watch-Queue): der Leser
+        wartet nur darauf, wenn er gar nichts mehr zu lesen hat.
+        """
+        try:
+            for p in self._files:
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._incoming.append(p)
+                    self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._source_done = True
+                self._cond.notify_all()
+
+    def _next_path(self, block):
+        with self._cond:
+            while block and not self._incoming and not self._source_done and not self._closed:
+                self._cond.wait()
+            return self._incoming.popleft() if self._incoming else None
+
+    # ---- Leser ----
+    def _run(self):
+        window = deque()
+        try:
+            while not self._closed:
+                # Fenster mit dem auffüllen, was schon da ist, und dem Kernel Bescheid geben
+                while len(window) < self.lookahead + 1:
+                    p = self._next_path(block=not window)
+                    if p is None:
+                        break
+                    window.append(p)
+                    _will_need(p)
+                if not window:
+                    break
+                p = window.popleft()
+                try:
+                    size = os.stat(p).st_size
+                except OSError:
+                    self._put(p, None)
+                    continue
+                if size > self.max_bytes:
+                    self._put(p, None)
+                    continue
+                with self._cond:
+                    while self._used and self._used + size > self.max_bytes and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        break
+                    self._used += size
+                try:
+                    data = read_file(p)
+                except OSError:
+                    data = None
+                # Reservierung an die tatsächlich gelesene Größe anpassen
+                self.release(size - (len(data) if data is not None else 0))
+                self._put(p, data)
+        finally:
+            self._put(self._END, None)
+
+    def _put(self, p, data):
+        with self._cond:
+            self._ready.append((p, data))
+            self._cond.notify_all()
+
+    # ---- Verbraucher ----
+    def __iter__(self):
+        while True:
+            with self._cond:
+                while not self._ready:
+                    self._cond.wait()
+                p, data = self._ready.popleft()
+            if p is self._END:
+                with self._cond:
+                    # Ende für alle weiteren Verbraucher sichtbar lassen
+                    self._ready.appendleft((p, data))
+                return
+            yield Path(p), data
+
+    def release(self, n: int):
+        with self._cond:
+            self._used = max(0, self._used - n)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
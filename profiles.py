@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# profiles.py – benannte Sync-Profile und ein Scheduler, der mehrere Jobs gleichzeitig fährt
+import json
+import threading
+import time
+from pathlib import Path
+
+import upload
+from sync_core import split_csv, collect_files, upload_to_parent, RemoteDirs
+
+PROFILES_FILE = Path.home() / ".brb_sync_profiles.json"
+
+PROFILE_DEFAULTS = {
+    "dir": "",
+    "include": "*",
+    "exclude": "*.tmp,*.ds_store",
+    "recursive": True,
+    "mirror": True,
+    "prefetch_mb": 0,
+    "priority": 0,   # höhere Priorität wird zuerst bedient
+    "weight": 1,     # Anteil an den Workern innerhalb derselben Priorität
+}
+
+
+# ---------- Profile ----------
+def load_profiles() -> dict:
+    try:
+        data = json.loads(PROFILES_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return {name: {**PROFILE_DEFAULTS, **p} for name, p in data.get("profiles", {}).items()}
+
+
+def save_profile(name: str, profile: dict):
+    try:
+        data = json.loads(PROFILES_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    data.setdefault("profiles", {})[name] = {k: profile.get(k, v) for k, v in PROFILE_DEFAULTS.items()}
+    PROFILES_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def delete_profile(name: str) -> bool:
+    try:
+        data = json.loads(PROFILES_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if data.get("profiles", {}).pop(name, None) is None:
+        return False
+    PROFILES_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    return True
+
+
+# ---------- Jobs ----------
+class Job:
+    """Ein Sync-Lauf für ein Profil. Zustand: queued → running → done/cancelled (paused dazwischen)."""
+
+    def __init__(self, name: str, profile: dict, on_result=None, on_done=None):
+        self.name = name
+        self.profile = {**PROFILE_DEFAULTS, **profile}
+        self.root = Path(self.profile["dir"]).expanduser().resolve()
+        self.priority = int(self.profile["priority"])
+        self.weight = max(1, int(self.profile["weight"]))
+        self.on_result = on_result
+        self.on_done = on_done
+        self.session = None
+        self.state = "queued"
+        self.error = None
+        self.files = []
+        self.dirs = None
+        self.total = self.done = self.ok = self.fail = 0
+        self.bytes_total = self.bytes_done = 0
+        self.started = self.finished = None
+        self.vtime = 0.0          # virtuelle Zeit für Fair-Share
+        self.in_flight = 0
+        self._source = None
+        self._prefetch = None
+        self._exhausted = False
+        self._lock = threading.Lock()
+        self.finished_event = threading.Event()
+
+    def prepare(self, session, workers, slots=None):
+        """
+        Dateien suchen und (optional) Remote-Ordner anlegen – vor dem ersten Upload.
+        slots: Semaphore des Schedulers, damit Ordner-Requests das Worker-Limit einhalten.
+        """
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"Ordner nicht gefunden: {self.root}")
+        p = self.profile
+        self.files = collect_files(self.root, split_csv(p["include"]), split_csv(p["exclude"]),
+                                   recursive=bool(p["recursive"]))
+        self.total = len(self.files)
+        self.bytes_total = sum(f.stat().st_size for f in self.files)
+        if self.state == "cancelled":
+            return
+        if p["mirror"]:
+            self.dirs = RemoteDirs(session, self.root, slots=slots)
+            self.dirs.ensure(self.files, workers=workers)
+        prefetch_bytes = max(0, int(p["prefetch_mb"])) * 1024 * 1024
+        if prefetch_bytes:
+            from prefetch import Prefetcher, order_by_locality
+            self._prefetch = Prefetcher(order_by_locality(self.files), max_bytes=prefetch_bytes)
+            self._source = iter(self._prefetch)
+        else:
+            self._prefetch = None
+            self._source = ((f, None) for f in self.files)
+
+    @property
+    def exhausted(self) -> bool:
+        return self._exhausted
+
+    def runnable(self) -> bool:
+        return self.state in ("queued", "running") and not self._exhausted
+
+    def take(self):
+        """Nächste Datei (path, data) oder None, wenn nichts mehr kommt."""
+        with self._lock:
+            if self._exhausted:
+                return None
+            item = next(self._source, None)
+            if item is None:
+                self._exhausted = True
+            return item
+
+    def record(self, res, err):
+        with self._lock:
+            self.done += 1
+            if err is None:
+                self.ok += 1
+                self.bytes_done += res["size"]
+            else:
+                self.fail += 1
+
+    def release(self, data):
+        if self._prefetch and data is not None:
+            self._prefetch.release(len(data))
+
+    def close(self):
+        if self._prefetch:
+            self._prefetch.close()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "state": self.state, "dir": str(self.root),
+            "priority": self.priority, "weight": self.weight,
+            "total": self.total, "done": self.done, "ok": self.ok, "fail": self.fail,
+            "bytes_total": self.bytes_total, "bytes_done": self.bytes_done,
+            "started": self.started, "finished": self.finished, "error": self.error,
+        }
+
+
+# ---------- Scheduler ----------
+class Scheduler:
+    """
+    Fährt mehrere Jobs in einem Prozess mit einem gemeinsamen Worker-Limit.
+
+    - Eine eingeloggte Session pro Konto (session_for), geteilt von allen Jobs dieses Kontos.
+    - Ein Verbindungs-Pool: Sessions und Speicher-Uploads nutzen upload.POOL_SIZE = workers.
+    - Ein Request-Limit: Uploads und das Anlegen von Ordnern (Job.prepare) teilen sich
+      `workers` Slots, auch wenn mehrere Jobs gleichzeitig vorbereitet werden.
+    - Auswahl: höchste Priorität zuerst; innerhalb einer Priorität bekommt jeder Job Uploads
+      im Verhältnis seines Gewichts (Stride-Scheduling über Job.vtime).
+    """
+
+    def __init__(self, workers=4):
+        self.workers = max(1, workers)
+        upload.configure_pools(self.workers)
+        self.jobs = []
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+    # ---- Sessions ----
+    def session_for(self, username, password, use_cache=True):
+        with self._sessions_lock:
+            s = self._sessions.get(username)
+            if s is None:
+                if not password:
+                    raise RuntimeError(f"Keine Session für {username} – Passwort nötig.")
+                s = upload.create_session(username, password, use_cache=use_cache)
+                self._sessions[username] = s
+            return s
+
+    # ---- Jobs ----
+    def submit(self, job: Job, session):
+        """
+        Job vorbereiten (Dateisuche, Ordner) und einreihen. Fehler landen in job.error.
+        Ein schon abgebrochener Job (z. B. während des Logins) wird ohne Vorbereitung beendet.
+        """
+        job.session = session
+        with self._cond:
+            if job.state == "cancelled":
+                self.jobs.append(job)
+                skip = True
+            else:
+                skip = False
+        if skip:
+            self._finish(job)
+            return job
+        try:
+            job.prepare(session, self.workers, slots=self._slots)
+        except (Exception, SystemExit) as e:
+            job.state = "failed"
+            job.error = str(e) if isinstance(e, Exception) else "Login fehlgeschlagen"
+            with self._cond:
+                self.jobs.append(job)
+            self._finish(job)
+            return job
+        with self._cond:
+            self.jobs.append(job)
+            cancelled = job.state == "cancelled"
+            if not cancelled:
+                # Neue Jobs starten bei der aktuellen virtuellen Zeit, nicht mit Vorsprung
+                active = [j.vtime for j in self.jobs if j.runnable() and j is not job]
+                job.vtime = min(active) if active else 0.0
+                self._cond.notify_all()
+        if cancelled:
+            # Während der Vorbereitung abgebrochen
+            job.close()
+            self._finish(job)
+            return job
+        self._ensure_workers()
+        return job
+
+    def pause(self, job: Job):
+        with self._cond:
+            if job.state in ("queued", "running"):
+                job.state = "paused"
+
+    def resume(self, job: Job):
+        with self._cond:
+            if job.state == "paused":
+                job.state = "running" if job.started else "queued"
+                active = [j.vtime for j in self.jobs if j.runnable() and j is not job]
+                job.vtime = max(job.vtime, min(active)) if active else job.vtime
+                self._cond.notify_all()
+        # Quelle kann während der Pause leer geworden sein → dann holt kein Worker den Job mehr
+        self._maybe_finish(job)
+
+    def cancel(self, job: Job):
+        with self._cond:
+            if job.state in ("queued", "running", "paused"):
+                job.state = "cancelled"
+                self._cond.notify_all()
+        self._maybe_finish(job)
+
+    def _pick(self):
+        runnable = [j for j in self.jobs if j.runnable()]
+        if not runnable:
+            return None
+        top = max(j.priority for j in runnable)
+        return min((j for j in runnable if j.priority == top), key=lambda j: j.vtime)
+
+    # ---- Worker ----
+    def _ensure_workers(self):
+        with self._cond:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for _ in range(self.workers - len(self._threads)):
+                t = threading.Thread(target=self._worker, daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._pick()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = self._pick()
+                if self._stopped:
+                    return
+                job.vtime += 1.0 / job.weight
+                job.in_flight += 1
+                if job.state == "queued":
+                    job.state = "running"
+                    job.started = time.time()
+            item = job.take()
+            if item is not None:
+                self._upload(job, *item)
+            with self._cond:
+                job.in_flight -= 1
+            self._maybe_finish(job)
+
+    def _upload(self, job: Job, p: Path, data):
+        res, err = None, None
+        if job.state == "cancelled":
+            job.release(data)
+            return
+        try:
+            parent_id = job.dirs.parent_for(p) if job.dirs else None
+            with self._slots:
+                res = upload_to_parent(job.session, p, parent_id, data,
+                                       refresh_parent=job.dirs.refresh_parent if job.dirs else None)
+        except (Exception, SystemExit) as e:
+            err = e
+        finally:
+            job.release(data)
+        job.record(res, err)
+        if job.on_result:
+            job.on_result(job, p, res, err)
+
+    def _maybe_finish(self, job: Job):
+        with self._cond:
+            if job.in_flight or job.finished_event.is_set():
+                return
+            if job.state == "cancelled" or (job.exhausted and job.state == "running"):
+                if job.state == "running":
+                    job.state = "done"
+            else:
+                return
+        self._finish(job)
+
+    def _finish(self, job: Job):
+        with self._cond:
+            if job.finished_event.is_set():
+                return
+            job.finished = time.time()
+            job.finished_event.set()
+            self._cond.notify_all()
+        job.close()
+        if job.on_done:
+            job.on_done(job)
+
+    def wait(self, jobs=None, timeout=None) -> bool:
+        deadline = None if timeout is None else time.time() + timeout
+        for job in jobs or list(self.jobs):
+            left = None if deadline is None else max(0.0, deadline - time.time())
+            if not job.finished_event.wait(left):
+                return False
+        return True
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            for job in self.jobs:
+                if job.state in ("queued", "running", "paused"):
+                    job.state = "cancelled"
+            self._cond.notify_all()
+        for job in list(self.jobs):
+            self._maybe_finish(job)
+        with self._sessions_lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# restore.py – Dateien aus "Meine Dateien" parallel wiederherstellen (fortsetzbar, mit Prüfung)
+import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path, PurePosixPath
+
+import upload
+from sync_core import human_bytes
+from sync_cli import JsonLines, login, EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_LOGIN, EXIT_INTERRUPTED
+
+STARTUP_MS = (time.perf_counter() - _T0) * 1000.0
+
+CHUNK_SIZE = 8 * 1024 * 1024        # Range-Größe für große Dateien
+LARGE_FILE = 2 * CHUNK_SIZE         # ab hier parallel in Ranges laden
+STREAM_BLOCK = 256 * 1024
+
+
+# ---------- Remote-Liste ----------
+def safe_name(name) -> bool:
+    """Nur einfache Namen zulassen – keine Pfadtrenner, kein '.'/'..' (sonst Schreiben außerhalb von dest)."""
+    return (isinstance(name, str) and name not in ("", ".", "..")
+            and not any(c in name for c in ("/", "\\", "\0")))
+
+
+def list_tree(session, workers=4, on_dir=None, on_unsafe=None):
+    """
+    Listet alle Dateien rekursiv (Ordner einer Ebene parallel).
+    Gibt [(rel_path, entry)] zurück; entry ist das JSON-Objekt der API.
+    Einträge mit unsicherem Namen werden übersprungen und an on_unsafe(rel, entry) gemeldet.
+    """
+    files = []
+    level = [("", None)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while level:
+            results = pool.map(lambda d: upload.list_remote(session, d[1]), level)
+            nxt = []
+            for (rel, _), entries in zip(level, results):
+                if on_dir:
+                    on_dir(rel, len(entries))
+                for e in entries:
+                    name = e.get("name") or e.get("_id")
+                    child = f"{rel}/{name}" if rel else str(name)
+                    if not safe_name(name):
+                        if on_unsafe:
+                            on_unsafe(child, e)
+                        continue
+                    if e.get("isDirectory"):
+                        nxt.append((child, e.get("_id")))
+                    else:
+                        files.append((child, e))
+            level = nxt
+    return sorted(files, key=lambda t: t[0])
+
+
+def load_manifest(path: Path) -> dict:
+    """Liest sha256-Werte aus der JSON-Lines-Ausgabe von sync_cli.py (path -> sha256)."""
+    hashes = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("event") == "file" and rec.get("ok") and rec.get("sha256"):
+                hashes[rec["path"].replace("\\", "/")] = rec["sha256"]
+    return hashes
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---------- Download einer Datei ----------
+class RemoteFile:
+    """
+    Eine wiederherzustellende Datei. Geschrieben wird direkt in <ziel>.part im Zielordner;
+    <ziel>.part.json merkt sich die fertigen Ranges, damit ein Abbruch fortgesetzt werden kann.
+    """
+
+    def __init__(self, rel, entry, dest: Path, sha256=None):
+        self.rel = rel
+        self.file_id = entry.get("_id")
+        self.size = int(entry.get("size") or 0)
+        self.sha256 = sha256
+        parts = PurePosixPath(rel).parts
+        if not parts or not all(safe_name(p) for p in parts):
+            raise ValueError(f"Unsicherer Pfad: {rel!r}")
+        self.target = dest.joinpath(*parts)
+        self.part = self.target.with_name(self.target.name + ".part")
+        self.state_file = self.target.with_name(self.target.name + ".part.json")
+        self.lock = threading.Lock()
+        self.url = None
+        self.done = set()
+        self.chunks = max(1, -(-self.size // CHUNK_SIZE)) if self.size >= LARGE_FILE else 1
+        self.resumed = False
+        self.whole = False      # Server ignoriert Range → eine Range lädt die ganze Datei
+        self.completed = False
+
+    def is_complete(self) -> bool:
+        """Schon vorhanden und passend? (Größe, bei bekanntem Hash auch sha256)"""
+        try:
+            if self.target.stat().st_size != self.size:
+                return False
+        except OSError:
+            return False
+        return not self.sha256 or sha256_file(self.target) == self.sha256
+
+    def prepare(self):
+        """Zielordner anlegen, .part vorbelegen und gespeicherten Fortschritt übernehmen."""
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            st = json.loads(self.state_file.read_text(encoding="utf-8"))
+            if (st.get("id") == self.file_id and st.get("size") == self.size
+                    and st.get("chunk") == CHUNK_SIZE and self.part.exists()):
+                self.done = set(st.get("done", []))
+                self.resumed = bool(self.done)
+        except (OSError, ValueError):
+            pass
+        if not self.done:
+            with open(self.part, "wb") as f:
+                f.truncate(self.size)
+
+    def pending_chunks(self):
+        return [i for i in range(self.chunks) if i not in self.done]
+
+    def mark_done(self, *indices) -> bool:
+        """
+        Ranges fertig. True bekommt nur der eine Aufrufer, durch den alle Ranges da sind –
+        so wird finish() genau einmal aufgerufen.
+        """
+        with self.lock:
+            self.done.update(indices)
+            tmp = self.state_file.with_name(self.state_file.name + ".tmp")
+            tmp.write_text(json.dumps({"id": self.file_id, "size": self.size, "chunk": CHUNK_SIZE,
+                                       "done": sorted(self.done)}), encoding="utf-8")
+            os.replace(tmp, self.state_file)
+            if self.completed or len(self.done) != self.chunks:
+                return False
+            self.completed = True
+            return True
+
+    def claim_whole(self) -> bool:
+        """Nur die erste Range, die eine 200-Antwort statt 206 bekommt, lädt die ganze Datei."""
+        with self.lock:
+            if self.whole:
+                return False
+            self.whole = True
+            return True
+
+    def finish(self):
+        """Prüfen und .part an den endgültigen Namen verschieben."""
+        if len(self.done) != self.chunks:
+            raise RuntimeError(f"Unvollständig ({len(self.done)}/{self.chunks} Ranges)")
+        if self.sha256:
+            got = sha256_file(self.part)
+            if got != self.sha256:
+                self.discard()
+                raise RuntimeError(f"sha256 stimmt nicht ({got[:12]}… statt {self.sha256[:12]}…)")
+        os.replace(self.part, self.target)
+        try:
+            self.state_file.unlink()
+        except OSError:
+            pass
+
+    def discard(self):
+        for p in (self.part, self.state_file):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+
+
+class Restorer:
+    """Lädt RemoteFiles mit höchstens `workers` gleichzeitigen Requests herunter."""
+
+    def __init__(self, session, workers=4, should_run=lambda: True):
+        self.session = session
+        self.workers = max(1, workers)
+        self.should_run = should_run
+        # Signierte URLs gehen an den Speicher, ohne Cookies der Cloud-Session
+        if upload.POOL_SIZE < self.workers:
+            upload.configure_pools(self.workers)
+        self.http = upload.storage_session()
+
+    def _url(self, rf: RemoteFile, refresh=False) -> str:
+        with rf.lock:
+            if rf.url is None or refresh:
+                rf.url = upload.download_url(self.session, rf.file_id)
+            return rf.url
+
+    def _get(self, rf: RemoteFile, headers):
+        r = self.http.get(self._url(rf), headers=headers, stream=True)
+        if r.status_code in (401, 403):
+            # Signatur abgelaufen → neue URL holen
+            r.close()
+            r = self.http.get(self._url(rf, refresh=True), headers=headers, stream=True)
+        if r.status_code not in (200, 206):
+            r.close()
+            raise RuntimeError(f"Download HTTP {r.status_code}")
+        return r
+
+    def _fetch_chunk(self, rf: RemoteFile, idx: int) -> bool:
+        """Lädt Range idx und schreibt sie an ihre Stelle in .part. True = Datei vollständig."""
+        if not self.should_run() or rf.whole:
+            return False
+        start = idx * CHUNK_SIZE
+        end = min(rf.size, start + CHUNK_SIZE) - 1
+        ranged = rf.chunks > 1
+        headers = {"Range": f"bytes={start}-{end}"} if ranged else {}
+        with self._get(rf, headers) as r:
+            whole = not ranged
+            if ranged and r.status_code == 200:
+                # Server ignoriert Range → genau eine Range schreibt die komplette Datei
+                if not rf.claim_whole():
+                    return False
+                whole = True
+            if whole:
+                start, expected = 0, rf.size
+            else:
+                cr = r.headers.get("Content-Range", "")
+                if not cr.startswith(f"bytes {start}-"):
+                    raise RuntimeError(f"Falsche Range (Content-Range: {cr or '-'}, erwartet ab {start})")
+                expected = end - start + 1
+            written = 0
+            with open(rf.part, "r+b") as f:
+                f.seek(start)
+                for block in r.iter_content(STREAM_BLOCK):
+                    if written + len(block) > expected:
+                        raise RuntimeError(f"Zu viele Daten (mehr als {expected} Bytes ab {start})")
+                    f.write(block)
+                    written += len(block)
+        if written != expected:
+            raise RuntimeError(f"Unvollständig: {written} statt {expected} Bytes ab {start}")
+        if whole:
+            return rf.mark_done(*range(rf.chunks))
+        return rf.mark_done(idx)
+
+    def run(self, files, on_result=None):
+        """files: [RemoteFile]. on_result(rf, err, skipped) pro Datei. Gibt (ok, fail, skipped) zurück."""
+        ok = fail = skipped = 0
+        failed = set()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            # Vollständigkeit (ggf. Hash) parallel prüfen
+            complete = list(pool.map(RemoteFile.is_complete, files))
+            futures = {}
+            for rf, is_done in zip(files, complete):
+                if is_done:
+                    skipped += 1
+                    if on_result:
+                        on_result(rf, None, True)
+                    continue
+                try:
+                    rf.prepare()
+                except OSError as e:
+                    fail += 1
+                    if on_result:
+                        on_result(rf, e, False)
+                    continue
+                for idx in rf.pending_chunks():
+                    futures[pool.submit(self._fetch_chunk, rf, idx)] = rf
+                if not rf.pending_chunks():
+                    # Alle Ranges lagen schon vor, nur Abschluss fehlte
+                    futures[pool.submit(rf.mark_done)] = rf
+
+            for fut in as_completed(futures):
+                rf = futures[fut]
+                if rf.rel in failed:
+                    continue
+                err = fut.exception()
+                if err is None and not fut.result():
+                    continue
+                if err is None:
+                    try:
+                        rf.finish()
+                    except Exception as e:
+                        err = e
+                if err is None:
+                    ok += 1
+                else:
+                    # .part bleibt für die Fortsetzung liegen (außer bei Prüffehlern)
+                    fail += 1
+                    failed.add(rf.rel)
+                if on_result:
+                    on_result(rf, err, False)
+        except BaseException:
+            # Strg+C: offene Ranges verwerfen, fertige bleiben in .part.json vermerkt
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return ok, fail, skipped
+
+
+# ---------- CLI ----------
+def build_parser():
+    ap = argparse.ArgumentParser(description="Brandenburg Cloud: Dateien wiederherstellen")
+    ap.add_argument("dest", help="Zielordner")
+    ap.add_argument("--user", default=os.environ.get("BRB_USER"), help="Login (E-Mail), default: $BRB_USER")
+    ap.add_argument("--pass", dest="passwd", default=os.environ.get("BRB_PASS"),
+                    help="Passwort, default: $BRB_PASS")
+    ap.add_argument("--workers", type=int, default=4, help="Parallele Downloads (1–16), default: 4")
+    ap.add_argument("--manifest", default=None,
+                    help="JSON-Lines von sync_cli.py; vorhandene sha256-Werte werden geprüft")
+    ap.add_argument("--no-session-cache", dest="session_cache", action="store_false",
+                    help="Gespeicherte Login-Session nicht verwenden")
+    ap.add_argument("--jsonl", default="-", help="Ziel für JSON-Lines-Ergebnisse (default: stdout)")
+    ap.add_argument("--record-trace", default=None,
+                    help="HTTP-Verkehr geschwärzt in diese Datei aufzeichnen (für http_trace.py)")
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out_fh = sys.stdout if args.jsonl == "-" else open(args.jsonl, "a", encoding="utf-8")
+    out = JsonLines(out_fh)
+    recorder = None
+    if args.record_trace:
+        from http_trace import start_recording
+        recorder = start_recording(args.record_trace)
+    try:
+        return run(args, out)
+    finally:
+        if recorder:
+            from http_trace import stop_recording
+            stop_recording(recorder)
+        if out_fh is not sys.stdout:
+            out_fh.close()
+
+
+def run(args, out):
+    out.emit("start", startup_ms=round(STARTUP_MS, 1))
+    if not args.user or not args.passwd:
+        print("Fehler: Bitte --user/--pass oder BRB_USER/BRB_PASS angeben.", file=sys.stderr)
+        return EXIT_USAGE
+    dest = Path(args.dest).expanduser().resolve()
+    hashes = {}
+    if args.manifest:
+        try:
+            hashes = load_manifest(Path(args.manifest))
+        except OSError as e:
+            print(f"Fehler: Manifest nicht lesbar: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    workers = max(1, min(args.workers, 16))
+
+    session = login(args, out)
+    if session is None:
+        return EXIT_LOGIN
+
+    t0 = time.time()
+    stop = threading.Event()
+    try:
+        with session:
+            try:
+                unsafe = []
+                tree = list_tree(session, workers=workers, on_unsafe=lambda rel, e: unsafe.append(rel))
+            except (Exception, SystemExit) as e:
+                out.emit("list", ok=False, error=str(e))
+                return EXIT_FAILED
+            files = [RemoteFile(rel, e, dest, hashes.get(rel)) for rel, e in tree]
+            for rel in unsafe:
+                out.emit("file", path=rel, ok=False, error="Unsicherer Name, übersprungen")
+            total = sum(rf.size for rf in files)
+            out.emit("list", ok=True, files=len(files), bytes=total, human=human_bytes(total),
+                     seconds=round(time.time() - t0, 3))
+
+            def on_result(rf, err, skipped):
+                if skipped:
+                    out.emit("file", path=rf.rel, ok=True, skipped=True, size=rf.size)
+                elif err is None:
+                    out.emit("file", path=rf.rel, ok=True, size=rf.size, resumed=rf.resumed,
+                             verified="sha256" if rf.sha256 else "size")
+                else:
+                    out.emit("file", path=rf.rel, ok=False, error=str(err))
+
+            ok, fail, skipped = Restorer(session, workers, should_run=lambda: not stop.is_set()).run(
+                files, on_result)
+    except KeyboardInterrupt:
+        stop.set()
+        out.emit("summary", interrupted=True, seconds=round(time.time() - t0, 3))
+        return EXIT_INTERRUPTED
+
+    fail += len(unsafe)
+    out.emit("summary", ok=ok, fail=fail, skipped=skipped, seconds=round(time.time() - t0, 3))
+    return EXIT_OK if fail == 0 else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# sync_cli.py – Headless Ordner-Sync (für cron / Server, ohne tkinter)
+import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from queue import Queue
+
+import upload
+from sync_core import split_csv, collect_files, upload_files, RemoteDirs
+
+# Importzeit bis hier (ohne Interpreter-Start). bs4 wird erst bei Bedarf geladen.
+STARTUP_MS = (time.perf_counter() - _T0) * 1000.0
+STARTUP_BUDGET_MS = 250.0
+
+# Exit-Codes
+EXIT_OK = 0           # alles hochgeladen (oder nichts zu tun)
+EXIT_FAILED = 1       # mindestens eine Datei fehlgeschlagen
+EXIT_USAGE = 2        # falsche Argumente / Ordner fehlt (wie argparse)
+EXIT_LOGIN = 3        # Login fehlgeschlagen
+EXIT_BUDGET = 4       # --startup-check: Budget überschritten
+EXIT_DAEMON = 5       # --daemon: kein laufender Daemon erreichbar
+EXIT_INTERRUPTED = 130
+
+
+class JsonLines:
+    """Schreibt ein JSON-Objekt pro Zeile (thread-safe)."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.lock = threading.Lock()
+
+    def emit(self, event: str, **fields):
+        rec = {"event": event, "ts": round(time.time(), 3), **fields}
+        line = json.dumps(rec, ensure_ascii=False)
+        with self.lock:
+            self.fh.write(line + "\n")
+            self.fh.flush()
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Brandenburg Cloud: Headless Ordner-Sync")
+    ap.add_argument("dir", nargs="?", help="Ordner, der hochgeladen werden soll")
+    ap.add_argument("--user", default=os.environ.get("BRB_USER"), help="Login (E-Mail), default: $BRB_USER")
+    ap.add_argument("--pass", dest="passwd", default=os.environ.get("BRB_PASS"),
+                    help="Passwort, default: $BRB_PASS")
+    ap.add_argument("--include", default="*", help="Include-Muster (CSV), default: *")
+    ap.add_argument("--exclude", default="*.tmp,*.ds_store", help="Exclude-Muster (CSV)")
+    ap.add_argument("--no-recursive", dest="recursive", action="store_false", help="Nur oberste Ebene")
+    ap.add_argument("--workers", type=int, default=2, help="Parallele Uploads (1–5), default: 2")
+    ap.add_argument("--flat", action="store_true",
+                    help="Alle Dateien direkt nach \"Meine Dateien\" (keine Ordnerstruktur)")
+    ap.add_argument("--prefetch-mb", type=int, default=0,
+                    help="Quelldateien in Platten-Reihenfolge vorab lesen (Puffer in MB, z. B. 64 für USB-HDDs)")
+    ap.add_argument("--dry-run", action="store_true", help="Nur anzeigen, nichts hochladen")
+    ap.add_argument("--watch", action="store_true",
+                    help="Ordner beobachten und nur neue/geänderte Dateien hochladen (bis Strg+C)")
+    ap.add_argument("--debounce", type=float, default=2.0,
+                    help="Watch: Sekunden Ruhe nach dem Schließen einer Datei, default: 2")
+    ap.add_argument("--poll", action="store_true", help="Watch: Polling statt inotify erzwingen")
+    ap.add_argument("--profile", action="append", default=[],
+                    help="Gespeichertes Profil ausführen (mehrfach möglich, laufen gleichzeitig)")
+    ap.add_argument("--save-profile", metavar="NAME", default=None,
+                    help="Ordner und Optionen als Profil speichern (ohne hochzuladen)")
+    ap.add_argument("--list-profiles", action="store_true", help="Gespeicherte Profile anzeigen")
+    ap.add_argument("--priority", type=int, default=0, help="Profil: Priorität (höher zuerst), default: 0")
+    ap.add_argument("--weight", type=int, default=1, help="Profil: Anteil an den Workern, default: 1")
+    ap.add_argument("--daemon", action="store_true",
+                    help="Job an den laufenden sync_daemon.py übergeben und dessen Fortschritt anzeigen")
+    ap.add_argument("--no-session-cache", dest="session_cache", action="store_false",
+                    help="Gespeicherte Login-Session nicht verwenden (immer voll einloggen)")
+    ap.add_argument("--jsonl", default="-", help="Ziel für JSON-Lines-Ergebnisse (default: stdout)")
+    ap.add_argument("--record-trace", default=None,
+                    help="HTTP-Verkehr geschwärzt in diese Datei aufzeichnen (für http_trace.py)")
+    ap.add_argument("--startup-check", action="store_true",
+                    help=f"Nur Startzeit messen (Budget {STARTUP_BUDGET_MS:.0f} ms) und beenden")
+    return ap
+
+
+def main(argv=None):
+    ap = build_parser()
+    args = ap.parse_args(argv)
+
+    out_fh = sys.stdout if args.jsonl == "-" else open(args.jsonl, "a", encoding="utf-8")
+    out = JsonLines(out_fh)
+    recorder = None
+    if args.record_trace:
+        from http_trace import start_recording
+        recorder = start_recording(args.record_trace)
+    try:
+        return run(args, ap, out)
+    finally:
+        if recorder:
+            from http_trace import stop_recording
+            stop_recording(recorder)
+        if out_fh is not sys.stdout:
+            out_fh.close()
+
+
+def run(args, ap, out):
+    within_budget = STARTUP_MS <= STARTUP_BUDGET_MS
+    out.emit("start", startup_ms=round(STARTUP_MS, 1), budget_ms=STARTUP_BUDGET_MS,
+             within_budget=within_budget, bs4_loaded="bs4" in sys.modules)
+    if args.startup_check:
+        return EXIT_OK if within_budget else EXIT_BUDGET
+    if not within_budget:
+        print(f"Warnung: Startzeit {STARTUP_MS:.0f} ms > Budget {STARTUP_BUDGET_MS:.0f} ms", file=sys.stderr)
+
+    if args.list_profiles or args.save_profile:
+        return manage_profiles(args, out)
+    if args.daemon:
+        if args.dry_run:
+            print("Fehler: --dry-run geht nicht zusammen mit --daemon.", file=sys.stderr)
+            return EXIT_USAGE
+        return run_daemon(args, ap, out)
+    if args.profile:
+        if args.dry_run:
+            print("Fehler: --dry-run geht nicht zusammen mit --profile.", file=sys.stderr)
+            return EXIT_USAGE
+        return run_profiles(args, out)
+
+    if not args.dir:
+        ap.print_usage(sys.stderr)
+        print("Fehler: Ordner fehlt.", file=sys.stderr)
+        return EXIT_USAGE
+    if not args.user or not args.passwd:
+        print("Fehler: Bitte --user/--pass oder BRB_USER/BRB_PASS angeben.", file=sys.stderr)
+        return EXIT_USAGE
+
+    root = Path(args.dir).expanduser().resolve()
+    if not root.is_dir():
+        print(f"Fehler: Ordner nicht gefunden: {root}", file=sys.stderr)
+        return EXIT_USAGE
+
+    workers = max(1, min(args.workers, 5))
+    if args.watch:
+        if args.dry_run:
+            print("Fehler: --dry-run geht nicht zusammen mit --watch.", file=sys.stderr)
+            return EXIT_USAGE
+        return run_watch(args, root, workers, out)
+
+    files = collect_files(root, split_csv(args.include), split_csv(args.exclude), recursive=args.recursive)
+    total_bytes = sum(p.stat().st_size for p in files)
+    out.emit("scan", root=str(root), files=len(files), bytes=total_bytes)
+
+    t0 = time.time()
+    if args.dry_run:
+        for p in files:
+            out.emit("file", path=str(p.relative_to(root)), ok=True, dry_run=True, size=p.stat().st_size)
+        out.emit("summary", ok=len(files), fail=0, seconds=round(time.time() - t0, 3), dry_run=True)
+        return EXIT_OK
+    if not files:
+        out.emit("summary", ok=0, fail=0, seconds=0.0)
+        return EXIT_OK
+
+    # Einmal einloggen, Session für alle Dateien nutzen
+    session = login(args, out)
+    if session is None:
+        return EXIT_LOGIN
+
+    parent_for = refresh_parent = None
+    if not args.flat:
+        dirs = mirror_dirs(session, root, files, workers, out)
+        if dirs is None:
+            return EXIT_FAILED
+        parent_for, refresh_parent = dirs.parent_for, dirs.refresh_parent
+
+    prefetch_bytes = max(0, args.prefetch_mb) * 1024 * 1024
+    if prefetch_bytes:
+        from prefetch import order_by_locality
+        files = order_by_locality(files)
+
+    try:
+        with session:
+            ok, fail = upload_files(session, files, workers=workers, on_result=result_emitter(root, out),
+                                    parent_for=parent_for, prefetch_bytes=prefetch_bytes,
+                                    refresh_parent=refresh_parent)
+    except KeyboardInterrupt:
+        out.emit("summary", interrupted=True, seconds=round(time.time() - t0, 3))
+        return EXIT_INTERRUPTED
+
+    out.emit("summary", ok=ok, fail=fail, seconds=round(time.time() - t0, 3))
+    return EXIT_OK if fail == 0 else EXIT_FAILED
+
+
+def manage_profiles(args, out):
+    import profiles
+
+    if args.save_profile:
+        if not args.dir:
+            print("Fehler: Ordner fehlt.", file=sys.stderr)
+            return EXIT_USAGE
+        profiles.save_profile(args.save_profile, {
+            "dir": str(Path(args.dir).expanduser().resolve()),
+            "include": args.include,
+            "exclude": args.exclude,
+            "recursive": args.recursive,
+            "mirror": not args.flat,
+            "prefetch_mb": args.prefetch_mb,
+            "priority": args.priority,
+            "weight": args.weight,
+        })
+        out.emit("profile", name=args.save_profile, saved=True)
+    if args.list_profiles:
+        for name, p in sorted(profiles.load_profiles().items()):
+            out.emit("profile", name=name, **p)
+    return EXIT_OK
+
+
+def run_profiles(args, out):
+    """Mehrere Profile gleichzeitig: ein Login, ein Verbindungs-Pool, gemeinsames Worker-Limit."""
+    import profiles
+
+    known = profiles.load_profiles()
+    missing = [n for n in args.profile if n not in known]
+    if missing:
+        print(f"Fehler: Unbekannte Profile: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_USAGE
+    if not args.user or not args.passwd:
+        print("Fehler: Bitte --user/--pass oder BRB_USER/BRB_PASS angeben.", file=sys.stderr)
+        return EXIT_USAGE
+
+    sched = profiles.Scheduler(workers=max(1, min(args.workers, 16)))
+    t0 = time.time()
+    try:
+        session = sched.session_for(args.user, args.passwd, use_cache=args.session_cache)
+    except (Exception, SystemExit) as e:
+        out.emit("login", ok=False, error="Login fehlgeschlagen" if isinstance(e, SystemExit) else str(e))
+        return EXIT_LOGIN
+    out.emit("login", ok=True, cached=session.login_generation == 0, seconds=round(time.time() - t0, 3))
+
+    def on_result(job, p, res, err):
+        rel = str(p.relative_to(job.root))
+        if err is None:
+            out.emit("file", job=job.name, path=rel, ok=True, size=res["size"], mime=res["mime"],
+                     sha256=res["sha256"])
+        else:
+            out.emit("file", job=job.name, path=rel, ok=False, error=str(err))
+
+    def on_done(job):
+        out.emit("job", **job.to_dict())
+
+    jobs = []
+    try:
+        for name in args.profile:
+            job = profiles.Job(name, known[name], on_result=on_result, on_done=on_done)
+            sched.submit(job, session)
+            if job.state != "failed":
+                out.emit("job", **job.to_dict())
+            jobs.append(job)
+        sched.wait(jobs)
+    except KeyboardInterrupt:
+        sched.shutdown()
+        out.emit("summary", interrupted=True, seconds=round(time.time() - t0, 3))
+        return EXIT_INTERRUPTED
+    sched.shutdown()
+
+    ok = sum(j.ok for j in jobs)
+    fail = sum(j.fail for j in jobs) + sum(1 for j in jobs if j.state == "failed")
+    out.emit("summary", ok=ok, fail=fail, jobs=len(jobs), seconds=round(time.time() - t0, 3))
+    return EXIT_OK if fail == 0 else EXIT_FAILED
+
+
+def run_daemon(args, ap, out):
+    """Thin Client: Login, Pool und Upload-Queue liegen im Daemon, hier nur Übergabe und Fortschritt."""
+    from sync_daemon import DaemonClient, DaemonError
+
+    if not args.profile and not args.dir:
+        ap.print_usage(sys.stderr)
+        print("Fehler: Ordner oder --profile fehlt.", file=sys.stderr)
+        return EXIT_USAGE
+    if not args.user:
+        print("Fehler: Bitte --user oder BRB_USER angeben.", file=sys.stderr)
+        return EXIT_USAGE
+    client = DaemonClient.find()
+    if client is None:
+        print("Fehler: Kein laufender Daemon gefunden (python sync_daemon.py serve).", file=sys.stderr)
+        return EXIT_DAEMON
+
+    # Passwort nur mitschicken, der Daemon braucht es nur ohne eigene Session
+    auth = {"user": args.user, "password": args.passwd}
+    if args.profile:
+        bodies = [{"profile": name, **auth} for name in args.profile]
+    else:
+        bodies = [{
+            "dir": str(Path(args.dir).expanduser().resolve()),
+            "include": args.include, "exclude": args.exclude, "recursive": args.recursive,
+            "mirror": not args.flat, "prefetch_mb": args.prefetch_mb,
+            "priority": args.priority, "weight": args.weight, **auth,
+        }]
+
+    t0 = time.time()
+    jobs = []
+    try:
+        for body in bodies:
+            job = client.submit(**body)
+            out.emit("job", id=job["id"], **{k: v for k, v in job.items() if k != "id"})
+            jobs.append(job["id"])
+        finals = []
+        for job_id in jobs:
+            def on_event(ev, job_id=job_id):
+                fields = {k: v for k, v in ev.items() if k not in ("event", "seq", "ts")}
+                out.emit(ev["event"], job_id=job_id, **fields)
+            finals.append(client.follow(job_id, on_event))
+    except DaemonError as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return EXIT_DAEMON if not jobs else EXIT_FAILED
+    except KeyboardInterrupt:
+        # Strg+C bricht nur die Anzeige ab; die Jobs laufen im Daemon weiter
+        out.emit("summary", interrupted=True, jobs=jobs, seconds=round(time.time() - t0, 3))
+        return EXIT_INTERRUPTED
+
+    ok = sum(j["ok"] for j in finals)
+    fail = sum(j["fail"] for j in finals) + sum(1 for j in finals if j["state"] == "failed")
+    out.emit("summary", ok=ok, fail=fail, jobs=len(finals), seconds=round(time.time() - t0, 3), daemon=True)
+    return EXIT_OK if fail == 0 else EXIT_FAILED
+
+
+def login(args, out):
+    t0 = time.time()
+    try:
+        session = upload.create_session(args.user, args.passwd, use_cache=args.session_cache)
+    except (Exception, SystemExit) as e:
+        # die() liefert nur SystemExit(1), die Meldung steht bereits auf stderr
+        out.emit("login", ok=False, error="Login fehlgeschlagen" if isinstance(e, SystemExit) else str(e))
+        return None
+    # cached=True: Cookies aus dem Cache, Prüfung erst beim ersten Upload
+    out.emit("login", ok=True, cached=session.login_generation == 0, seconds=round(time.time() - t0, 3))
+    return session
+
+
+def mirror_dirs(session, root, files, workers, out, dirs=None):
+    """Legt fehlende Remote-Ordner an; gibt RemoteDirs oder bei Fehler None zurück."""
+    t0 = time.time()
+    dirs = dirs or RemoteDirs(session, root)
+    created, found = dirs.created, dirs.found
+    try:
+        dirs.ensure(files, workers=workers)
+    except (Exception, SystemExit) as e:
+        out.emit("dirs", ok=False, error=str(e))
+        return None
+    if dirs.created != created or dirs.found != found:
+        out.emit("dirs", ok=True, created=dirs.created - created, found=dirs.found - found,
+                 seconds=round(time.time() - t0, 3))
+    return dirs
+
+
+def result_emitter(root, out):
+    def on_result(p, res, err):
+        rel = str(p.relative_to(root))
+        if err is None:
+            out.emit("file", path=rel, ok=True, size=res["size"], mime=res["mime"], sha256=res["sha256"])
+        else:
+            out.emit("file", path=rel, ok=False, error=str(err))
+    return on_result
+
+
+def run_watch(args, root, workers, out):
+    from watch import Watcher
+
+    session = login(args, out)
+    if session is None:
+        return EXIT_LOGIN
+
+    watcher = Watcher(root, split_csv(args.include), split_csv(args.exclude), recursive=args.recursive,
+                      debounce=args.debounce, force_polling=args.poll)
+    out.emit("watch", root=str(root), backend=watcher.backend, debounce=args.debounce)
+
+    dirs = None if args.flat else RemoteDirs(session, root)
+
+    # Upload-Threads holen fertige Dateien aus der Queue (None = Ende)
+    q = Queue()
+    counts = [0, 0, 0]  # ok, fail, ohne Zielordner übersprungen
+
+    def uploader():
+        counts[0], counts[1] = upload_files(session, iter(q.get, None), workers=workers,
+                                            on_result=result_emitter(root, out),
+                                            parent_for=dirs.parent_for if dirs else None,
+                                            refresh_parent=dirs.refresh_parent if dirs else None,
+                                            prefetch_bytes=max(0, args.prefetch_mb) * 1024 * 1024)
+
+    t_up = threading.Thread(target=uploader, daemon=True)
+    t_up.start()
+    t0 = time.time()
+
+    def on_ready(paths):
+        # Neue Unterordner zuerst anlegen, damit die Uploads direkt ins Ziel gehen
+        if dirs and mirror_dirs(session, root, paths, workers, out, dirs=dirs) is None:
+            for p in paths:
+                out.emit("file", path=str(p.relative_to(root)), ok=False, error="Zielordner fehlt")
+            counts[2] += len(paths)
+            return
+        for p in paths:
+            q.put(p)
+
+    try:
+        watcher.run(on_ready, stop_check=None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        q.put(None)
+    try:
+        t_up.join()
+    except KeyboardInterrupt:
+        out.emit("summary", interrupted=True, seconds=round(time.time() - t0, 3))
+        return EXIT_INTERRUPTED
+    session.close()
+    fail = counts[1] + counts[2]
+    out.emit("summary", ok=counts[0], fail=fail, seconds=round(time.time() - t0, 3), watch=True)
+    return EXIT_OK if fail == 0 else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# sync_core.py – gemeinsame Sync-Logik für GUI und CLI (ohne tkinter)
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path, PurePosixPath
+from fnmatch import fnmatch
+
+import upload  # erwartet: upload_with_session(), list_remote(), create_directory()
+
+DIR_CACHE_FILE = Path.home() / ".brb_dir_cache.json"
+_DIR_CACHE_LOCK = threading.Lock()   # mehrere RemoteDirs (Profile, Daemon-Jobs) in einem Prozess
+
+
+# ---------- Helpers ----------
+def human_bytes(n: int) -> str:
+    step = 1024.0
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < step:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.2f} {unit}"
+        n /= step
+    return f"{n:.2f} PB"
+
+
+def split_csv(text: str):
+    return [s.strip() for s in (text or "").split(",") if s.strip()]
+
+
+def name_matches(name: str, include_patterns, exclude_patterns) -> bool:
+    if include_patterns and not any(fnmatch(name, pat) for pat in include_patterns):
+        return False
+    if exclude_patterns and any(fnmatch(name, pat) for pat in exclude_patterns):
+        return False
+    if name.startswith("."):
+        return False
+    return True
+
+
+def collect_files(root: Path, include_patterns, exclude_patterns, recursive=True):
+    files = []
+    it = root.rglob("*") if recursive else root.glob("*")
+    for p in it:
+        if not p.is_file():
+            continue
+        if not name_matches(p.name, include_patterns, exclude_patterns):
+            continue
+        files.append(p)
+    return sorted(files)
+
+
+# ---------- Remote-Ordner ----------
+class RemoteDirs:
+    """
+    Spiegelt die lokale Ordnerstruktur (relativ zu root) in "Meine Dateien".
+
+    Ordner-IDs werden pro Konto in DIR_CACHE_FILE gemerkt ("a/b" -> id), damit spätere
+    Läufe weder nachschlagen noch anlegen müssen. Fehlende Ordner werden Ebene für Ebene
+    angelegt, innerhalb einer Ebene parallel. Lehnt der Server eine gemerkte ID ab (Ordner
+    online gelöscht), wird sie mit refresh_parent() verworfen und neu aufgelöst.
+    slots (z. B. threading.Semaphore) begrenzt die Ordner-Requests zusammen mit anderer Arbeit.
+    """
+
+    def __init__(self, session, root: Path, cache_file: Path = None, slots=None):
+        self.session = session
+        self._slots = slots or nullcontext()
+        self.root = Path(root)
+        self.cache_file = cache_file or DIR_CACHE_FILE
+        self._key = upload.account_key(getattr(session, "username", ""))
+        self._ids = self._load()
+        self._dropped = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.created = 0
+        self.found = 0
+
+    def _load(self) -> dict:
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            return dict(data.get(self._key, {}))
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Mit dem Stand auf der Platte zusammenführen (andere Instanzen) und atomar schreiben."""
+        with _DIR_CACHE_LOCK:
+            try:
+                data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            with self._lock:
+                merged = {k: v for k, v in data.get(self._key, {}).items() if k not in self._dropped}
+                merged.update(self._ids)
+            data[self._key] = merged
+            tmp = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+            try:
+                tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, self.cache_file)
+            except OSError:
+                pass
+
+    def _rel_dir(self, p: Path) -> str:
+        rel = p.parent.relative_to(self.root).as_posix()
+        return "" if rel == "." else rel
+
+    def parent_for(self, p: Path):
+        """Remote-Ordner-ID für eine lokale Datei (None = oberste Ebene). Kein Request."""
+        return self._ids.get(self._rel_dir(p))
+
+    def refresh_parent(self, p: Path, stale_id):
+        """
+        Der Server hat stale_id als Zielordner für p abgelehnt: den Ordner, seine Oberordner und
+        Unterordner aus dem Cache werfen und neu nachschlagen bzw. anlegen. Gibt die neue ID zurück.
+        """
+        rel = self._rel_dir(p)
+        with self._refresh_lock:
+            chain = set()
+            d = rel
+            while d:
+                chain.add(d)
+                d = PurePosixPath(d).parent.as_posix()
+                d = "" if d == "." else d
+            with self._lock:
+                # Hat ein anderer Upload den Ordner schon erneuert, nichts verwerfen
+                if self._ids.get(rel) == stale_id:
+                    for k in list(self._ids):
+                        if k in chain or k.startswith(rel + "/"):
+                            del self._ids[k]
+                            self._dropped.add(k)
+            # Der Aufrufer (ein Upload) belegt schon einen Slot
+            self._ensure([p], 1, nullcontext())
+            with self._lock:
+                return self._ids.get(rel)
+
+    def ensure(self, files, workers=2):
+        """Legt alle fehlenden Ordner für files an (Ebene für Ebene)."""
+        self._ensure(files, workers, self._slots)
+
+    def _ensure(self, files, workers, slots):
+        needed = set()
+        for p in files:
+            rel = self._rel_dir(p)
+            while rel:
+                needed.add(rel)
+                rel = PurePosixPath(rel).parent.as_posix()
+                rel = "" if rel == "." else rel
+        missing = sorted(d for d in needed if d not in self._ids)
+        if not missing:
+            return
+
+        by_depth = {}
+        for d in missing:
+            by_depth.setdefault(d.count("/"), []).append(d)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for depth in sorted(by_depth):
+                level = by_depth[depth]
+                # Pro Elternordner einmal nachschauen, was es schon gibt
+                parents = sorted({PurePosixPath(d).parent.as_posix() for d in level})
+                parents = ["" if x == "." else x for x in parents]
+                existing = dict(zip(parents, pool.map(lambda d: self._existing_dirs(d, slots), parents)))
+
+                with slots:
+                    csrf = upload.must_get_csrf(self.session, "/files/my/")
+
+                def make(d):
+                    parent = PurePosixPath(d).parent.as_posix()
+                    parent = "" if parent == "." else parent
+                    name = PurePosixPath(d).name
+                    dir_id = existing.get(parent, {}).get(name)
+                    if dir_id:
+                        with self._lock:
+                            self.found += 1
+                    else:
+                        with slots:
+                            dir_id = upload.create_directory(self.session, name, self._ids.get(parent), csrf=csrf)
+                        with self._lock:
+                            self.created += 1
+                    with self._lock:
+                        self._ids[d] = dir_id
+                        self._dropped.discard(d)
+
+                list(pool.map(make, level))
+                self.save()
+
+    def _existing_dirs(self, parent_rel: str, slots) -> dict:
+        try:
+            with slots:
+                entries = upload.list_remote(self.session, self._ids.get(parent_rel))
+        except Exception:
+            # Nachschlagen ist nur eine Optimierung gegen Duplikate
+            return {}
+        return {e.get("name"): e.get("_id") for e in entries if e.get("isDirectory")}
+
+
+# ---------- Upload-Schleife ----------
+def upload_to_parent(session, p: Path, parent_id, data=None, refresh_parent=None) -> dict:
+    """upload_with_session; lehnt der Server den Zielordner ab, einmal mit erneuerter ID."""
+    try:
+        return upload.upload_with_session(session, str(p), parent_id=parent_id, data=data)
+    except upload.ParentNotFound:
+        if not refresh_parent:
+            raise
+        new_id = refresh_parent(p, parent_id)
+        return upload.upload_with_session(session, str(p), parent_id=new_id, data=data)
+
+
+def upload_files(session, files, workers=1, on_result=None, should_run=lambda: True, parent_for=None,
+                 prefetch_bytes=0, refresh_parent=None):
+    """
+    Lädt alle Dateien mit der bestehenden Session hoch.
+    on_result(p, res, err) wird pro Datei aufgerufen (res=dict oder None, err=Exception oder None).
+    parent_for(p) liefert optional die Remote-Ordner-ID (z. B. RemoteDirs.parent_for).
+    refresh_parent(p, stale_id) wird einmal gerufen, wenn der Server den Ordner ablehnt
+    (z. B. RemoteDirs.refresh_parent); der Upload wird dann mit der neuen ID wiederholt.
+    prefetch_bytes > 0: Dateien in dieser Reihenfolge vorab in einen Puffer dieser Größe lesen
+    (prefetch.Prefetcher), während die aktuellen Uploads laufen.
+    Gibt (ok, fail) zurück.
+    """
+    ok = 0
+    fail = 0
+    lock = threading.Lock()
+
+    def do_one(p: Path, data):
+        nonlocal ok, fail
+        if not should_run():
+            return
+        res, err = None, None
+        try:
+            parent_id = parent_for(p) if parent_for else None
+            res = upload_to_parent(session, p, parent_id, data, refresh_parent)
+        except (Exception, SystemExit) as e:  # die() beendet sonst still den Thread
+            err = e
+        finally:
+            if prefetch and data is not None:
+                prefetch.release(len(data))
+        with lock:
+            if err is None:
+                ok += 1
+            else:
+                fail += 1
+            if on_result:
+                on_result(p, res, err)
+
+    prefetch = None
+    if prefetch_bytes > 0:
+        from prefetch import Prefetcher
+        prefetch = Prefetcher(files, max_bytes=prefetch_bytes)
+        source = iter(prefetch)
+    else:
+        source = ((p, None) for p in files)
+
+    try:
+        if workers <= 1:
+            for p, data in source:
+                if not should_run():
+                    break
+                do_one(p, data)
+        else:
+            # Simple Thread-Pool
+            it_lock = threading.Lock()
+
+            def feeder():
+                while should_run():
+                    with it_lock:
+                        item = next(source, None)
+                    if item is None:
+                        break
+                    do_one(*item)
+
+            threads = [threading.Thread(target=feeder, daemon=True) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    finally:
+        if prefetch:
+            prefetch.close()
+
+    return ok, fail
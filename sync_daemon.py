@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# sync_daemon.py – Hintergrund-Dienst: hält Login, Verbindungen und Upload-Queue warm,
+# steuerbar über eine lokale HTTP-API (nur 127.0.0.1, Token in ~/.brb_daemon.json)
+import argparse
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.error import URLError, HTTPError
+from urllib.parse import urlparse, parse_qsl
+from urllib.request import Request, urlopen
+
+DAEMON_FILE = Path.home() / ".brb_daemon.json"
+DEFAULT_PORT = 8765
+TOKEN_HEADER = "X-BRB-Token"
+EVENTS_PER_JOB = 2000
+
+
+# ---------- Client (ohne requests, damit Thin-Clients schnell starten) ----------
+class DaemonError(Exception):
+    pass
+
+
+class DaemonClient:
+    def __init__(self, port, token, timeout=5.0):
+        self.base = f"http://127.0.0.1:{port}"
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def find(cls, timeout=1.0):
+        """Laufenden Daemon finden; None, wenn keiner erreichbar ist."""
+        try:
+            info = json.loads(DAEMON_FILE.read_text(encoding="utf-8"))
+            client = cls(info["port"], info["token"], timeout=timeout)
+            client.call("GET", "/status")
+            client.timeout = 30.0
+            return client
+        except (OSError, ValueError, KeyError, DaemonError):
+            return None
+
+    def call(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = Request(self.base + path, data=data, method=method,
+                      headers={TOKEN_HEADER: self.token, "Content-Type": "application/json"})
+        try:
+            with urlopen(req, timeout=self.timeout) as r:
+                return json.loads(r.read() or b"{}")
+        except HTTPError as e:
+            try:
+                msg = json.loads(e.read()).get("error", str(e))
+            except ValueError:
+                msg = str(e)
+            raise DaemonError(msg) from None
+        except (URLError, OSError) as e:
+            raise DaemonError(f"Daemon nicht erreichbar: {e}") from None
+
+    def submit(self, **job):
+        return self.call("POST", "/jobs", job)
+
+    def job(self, job_id):
+        return self.call("GET", f"/jobs/{job_id}")
+
+    def events(self, job_id, since=0):
+        return self.call("GET", f"/jobs/{job_id}/events?since={since}")
+
+    def control(self, job_id, action):
+        return self.call("POST", f"/jobs/{job_id}/{action}")
+
+    def follow(self, job_id, on_event, interval=0.5, should_run=lambda: True):
+        """Ereignisse eines Jobs abholen, bis er fertig ist. Gibt den End-Zustand zurück."""
+        since = 0
+        while True:
+            r = self.events(job_id, since)
+            for ev in r["events"]:
+                on_event(ev)
+            since = r["next"]
+            if r["job"]["state"] in ("done", "cancelled", "failed"):
+                return r["job"]
+            if not should_run():
+                return r["job"]
+            time.sleep(interval)
+
+
+# ---------- Daemon ----------
+class SyncDaemon:
+    """Besitzt den Scheduler (Sessions, Verbindungs-Pool, Worker) und alle Jobs."""
+
+    def __init__(self, workers=4, user=None, password=None, use_cache=True):
+        import upload  # noqa: F401  (einmal warm laden)
+        from profiles import Scheduler
+
+        self.scheduler = Scheduler(workers=workers)
+        self.use_cache = use_cache
+        self.started = time.time()
+        self.jobs = {}
+        self.events = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        if user and password:
+            # Login sofort, damit der erste Job direkt hochladen kann
+            self.scheduler.session_for(user, password, use_cache=use_cache)
+
+    # ---- Jobs ----
+    def submit(self, body: dict) -> dict:
+        import profiles
+
+        name = body.get("profile")
+        if name:
+            known = profiles.load_profiles()
+            if name not in known:
+                raise ValueError(f"Unbekanntes Profil: {name}")
+            profile = {**known[name], **(body.get("options") or {})}
+        elif body.get("dir"):
+            profile = {k: body[k] for k in profiles.PROFILE_DEFAULTS if k in body}
+            name = Path(body["dir"]).name or body["dir"]
+        else:
+            raise ValueError("'profile' oder 'dir' angeben.")
+        user = body.get("user")
+        if not user:
+            raise ValueError("'user' angeben.")
+
+        with self._lock:
+            job_id = str(self._next_id)
+            self._next_id += 1
+            ev = {"seq": 0, "items": deque(maxlen=EVENTS_PER_JOB)}
+            self.events[job_id] = ev
+
+        def emit(rec):
+            with self._lock:
+                ev["seq"] += 1
+                ev["items"].append({"seq": ev["seq"], "ts": round(time.time(), 3), **rec})
+
+        def on_result(job, p, res, err):
+            rel = str(p.relative_to(job.root))
+            if err is None:
+                emit({"event": "file", "path": rel, "ok": True, "size": res["size"], "mime": res["mime"],
+                      "sha256": res["sha256"]})
+            else:
+                emit({"event": "file", "path": rel, "ok": False, "error": str(err)})
+
+        def on_done(job):
+            emit({"event": "job", **job.to_dict()})
+
+        job = profiles.Job(name, profile, on_result=on_result, on_done=on_done)
+        job.id = job_id
+        with self._lock:
+            self.jobs[job_id] = job
+
+        def prepare():
+            # Login (falls nötig), Dateisuche und Ordner im Hintergrund; die API antwortet sofort
+            try:
+                session = self.scheduler.session_for(user, body.get("password"), use_cache=self.use_cache)
+            except (Exception, SystemExit) as e:
+                job.state = "failed"
+                job.error = "Login fehlgeschlagen" if isinstance(e, SystemExit) else str(e)
+                job.finished = time.time()
+                job.finished_event.set()
+                on_done(job)
+                return
+            # Während des Logins abgebrochen → submit() beendet den Job ohne Dateisuche/Ordner
+            self.scheduler.submit(job, session)
+            if job.state not in ("failed", "cancelled"):
+                emit({"event": "job", **job.to_dict()})
+
+        threading.Thread(target=prepare, daemon=True).start()
+        return self.job_dict(job)
+
+    def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def job_dict(self, job) -> dict:
+        return {"id": job.id, **job.to_dict()}
+
+    def job_events(self, job_id, since: int) -> dict:
+        job = self.get(job_id)
+        with self._lock:
+            ev = self.events[job_id]
+            items = [e for e in ev["items"] if e["seq"] > since]
+            nxt = ev["seq"]
+        return {"job": self.job_dict(job), "events": items, "next": nxt}
+
+    def control(self, job_id, action) -> dict:
+        job = self.get(job_id)
+        if action == "pause":
+            self.scheduler.pause(job)
+        elif action == "resume":
+            self.scheduler.resume(job)
+        elif action == "cancel":
+            self.scheduler.cancel(job)
+        else:
+            raise ValueError(f"Unbekannte Aktion: {action}")
+        return self.job_dict(job)
+
+    def status(self) -> dict:
+        states = {}
+        for job in list(self.jobs.values()):
+            states[job.state] = states.get(job.state, 0) + 1
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "workers": self.scheduler.workers,
+            "sessions": len(self.scheduler._sessions),
+            "jobs": states,
+        }
+
+    def metrics(self) -> dict:
+        jobs = list(self.jobs.values())
+        uptime = time.time() - self.started
+        bytes_done = sum(j.bytes_done for j in jobs)
+        return {
+            **self.status(),
+            "files_ok": sum(j.ok for j in jobs),
+            "files_failed": sum(j.fail for j in jobs),
+            "bytes_done": bytes_done,
+            "bytes_pending": sum(j.bytes_total - j.bytes_done for j in jobs if j.state in ("queued", "running", "paused")),
+            "in_flight": sum(j.in_flight for j in jobs),
+            "avg_bytes_per_s": round(bytes_done / uptime, 1) if uptime else 0.0,
+        }
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        srv = self.server
+        if not secrets.compare_digest(self.headers.get(TOKEN_HEADER, ""), srv.token):
+            return self._reply(403, {"error": "Falsches Token."})
+        n = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(n)) if n else {}
+        except ValueError:
+            return self._reply(400, {"error": "Ungültiges JSON."})
+        u = urlparse(self.path)
+        parts = [p for p in u.path.split("/") if p]
+        query = dict(parse_qsl(u.query))
+        d = srv.daemon
+        m = self.command
+        try:
+            if m == "GET" and parts == ["status"]:
+                return self._reply(200, d.status())
+            if m == "GET" and parts == ["metrics"]:
+                return self._reply(200, d.metrics())
+            if m == "GET" and parts == ["jobs"]:
+                return self._reply(200, {"jobs": [d.job_dict(j) for j in list(d.jobs.values())]})
+            if m == "POST" and parts == ["jobs"]:
+                return self._reply(201, d.submit(body))
+            if m == "GET" and len(parts) == 2 and parts[0] == "jobs":
+                return self._reply(200, d.job_dict(d.get(parts[1])))
+            if m == "GET" and len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+                return self._reply(200, d.job_events(parts[1], int(query.get("since", 0))))
+            if m == "POST" and len(parts) == 3 and parts[0] == "jobs":
+                return self._reply(200, d.control(parts[1], parts[2]))
+            if m == "POST" and parts == ["shutdown"]:
+                self._reply(200, {"ok": True})
+                threading.Thread(target=srv.shutdown, daemon=True).start()
+                return
+            return self._reply(404, {"error": "Unbekannter Pfad."})
+        except KeyError as e:
+            return self._reply(404, {"error": f"Unbekannter Job: {e}"})
+        except ValueError as e:
+            return self._reply(400, {"error": str(e)})
+
+    do_GET = do_POST = _route
+
+
+class DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, daemon: SyncDaemon, port=DEFAULT_PORT):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.daemon = daemon
+        self.token = secrets.token_urlsafe(24)
+
+    def publish(self):
+        """Port und Token für Clients ablegen (nur für den eigenen Benutzer lesbar)."""
+        fd = os.open(DAEMON_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"port": self.server_address[1], "token": self.token, "pid": os.getpid()}, f)
+        os.chmod(DAEMON_FILE, 0o600)
+
+    def unpublish(self):
+        try:
+            info = json.loads(DAEMON_FILE.read_text(encoding="utf-8"))
+            if info.get("pid") == os.getpid():
+                DAEMON_FILE.unlink()
+        except (OSError, ValueError):
+            pass
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Brandenburg Cloud: Sync-Daemon mit lokaler Steuer-API")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("serve", help="Daemon im Vordergrund starten")
+    sp.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port auf 127.0.0.1, default: {DEFAULT_PORT}")
+    sp.add_argument("--workers", type=int, default=4, help="Globales Upload-Limit, default: 4")
+    sp.add_argument("--user", default=os.environ.get("BRB_USER"), help="Beim Start einloggen, default: $BRB_USER")
+    sp.add_argument("--pass", dest="passwd", default=os.environ.get("BRB_PASS"), help="default: $BRB_PASS")
+    sp.add_argument("--no-session-cache", dest="session_cache", action="store_false")
+
+    sub.add_parser("status", help="Status des Daemons")
+    sub.add_parser("metrics", help="Kennzahlen des Daemons")
+    sub.add_parser("jobs", help="Alle Jobs anzeigen")
+    for action in ("pause", "resume", "cancel"):
+        p = sub.add_parser(action, help=f"Job {action}")
+        p.add_argument("job_id")
+    sub.add_parser("stop", help="Daemon beenden")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "serve":
+        daemon = SyncDaemon(workers=max(1, min(args.workers, 16)), user=args.user, password=args.passwd,
+                            use_cache=args.session_cache)
+        srv = DaemonServer(daemon, port=args.port)
+        srv.publish()
+        print(f"Daemon läuft auf 127.0.0.1:{srv.server_address[1]}", file=sys.stderr)
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.unpublish()
+            daemon.shutdown()
+            srv.server_close()
+        return 0
+
+    client = DaemonClient.find()
+    if client is None:
+        print("Kein laufender Daemon gefunden (python sync_daemon.py serve).", file=sys.stderr)
+        return 5
+    try:
+        if args.cmd == "status":
+            res = client.call("GET", "/status")
+        elif args.cmd == "metrics":
+            res = client.call("GET", "/metrics")
+        elif args.cmd == "jobs":
+            res = client.call("GET", "/jobs")
+        elif args.cmd == "stop":
+            res = client.call("POST", "/shutdown")
+        else:
+            res = client.control(args.job_id, args.cmd)
+    except DaemonError as e:
+        print(f"Fehler: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(res, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
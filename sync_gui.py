@@ -4,7 +4,6 @@ import threading
 import time
 import json
 from pathlib import Path
-from fnmatch import fnmatch
 from queue import Queue, Empty
 
 import tkinter as tk
@@ -12,37 +11,11 @@ from tkinter import ttk, filedialog, messagebox
 
 # Deine upload.py im gleichen Ordner:
 import upload  # erwartet: create_session(), upload_with_session()
+from sync_core import human_bytes, split_csv, collect_files, upload_files, RemoteDirs
 
 SETTINGS_FILE = Path.home() / ".brb_sync_gui.json"
 
 
-# ---------- Helpers ----------
-def human_bytes(n: int) -> str:
-    step = 1024.0
-    for unit in ("B", "KB", "MB", "GB", "TB"):
-        if n < step:
-            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.2f} {unit}"
-        n /= step
-    return f"{n:.2f} PB"
-
-
-def collect_files(root: Path, include_patterns, exclude_patterns, recursive=True):
-    files = []
-    it = root.rglob("*") if recursive else root.glob("*")
-    for p in it:
-        if not p.is_file():
-            continue
-        name = p.name
-        if include_patterns and not any(fnmatch(name, pat) for pat in include_patterns):
-            continue
-        if exclude_patterns and any(fnmatch(name, pat) for pat in exclude_patterns):
-            continue
-        if name.startswith("."):
-            continue
-        files.append(p)
-    return sorted(files)
-
-
 # ---------- Main GUI ----------
 class SyncGUI(tk.Tk):
     def __init__(self):
@@ -226,6 +199,16 @@ class SyncGUI(tk.Tk):
             row=1, column=2, sticky="w", padx=10, pady=4
         )
 
+        self.var_mirror = tk.BooleanVar(value=True)
+        ttk.Checkbutton(box_opts, text="Ordnerstruktur spiegeln", variable=self.var_mirror).grid(
+            row=2, column=2, sticky="w", padx=10, pady=(4, 10)
+        )
+
+        self.var_watch = tk.BooleanVar(value=False)
+        ttk.Checkbutton(box_opts, text="Danach beobachten (Watch)", variable=self.var_watch).grid(
+            row=1, column=3, columnspan=2, sticky="w", padx=10, pady=4
+        )
+
         ttk.Label(box_opts, text="Parallel (1–5):").grid(row=0, column=3, sticky="e", padx=(10, 4))
         self.var_workers = tk.IntVar(value=2)
         ttk.Spinbox(box_opts, from_=1, to=5, textvariable=self.var_workers, width=6).grid(
@@ -329,8 +312,8 @@ class SyncGUI(tk.Tk):
         if not root.exists():
             self.lbl_count.configure(text="0 Dateien (0 B)")
             return
-        include = [s.strip() for s in self.var_inc.get().split(",") if s.strip()]
-        exclude = [s.strip() for s in self.var_exc.get().split(",") if s.strip()]
+        include = split_csv(self.var_inc.get())
+        exclude = split_csv(self.var_exc.get())
         recursive = self.var_recursive.get()
         files = collect_files(root, include, exclude, recursive=recursive)
         total = sum(p.stat().st_size for p in files) if files else 0
@@ -365,7 +348,9 @@ class SyncGUI(tk.Tk):
             return
         self._log("→ Test-Login…")
         try:
-            s = upload.create_session(user, pw)
+            # Test prüft die Zugangsdaten wirklich (ohne Cache), speichert aber die neue Session
+            s = upload.create_session(user, pw, use_cache=False)
+            upload.save_session_cache(s)
             self._log("✓ Login erfolgreich.")
             messagebox.showinfo("OK", "Login erfolgreich.")
             s.close()
@@ -387,11 +372,13 @@ class SyncGUI(tk.Tk):
             messagebox.showerror("Fehler", "Bitte Ordner auswählen.")
             return
 
-        include = [s.strip() for s in self.var_inc.get().split(",") if s.strip()]
-        exclude = [s.strip() for s in self.var_exc.get().split(",") if s.strip()]
+        include = split_csv(self.var_inc.get())
+        exclude = split_csv(self.var_exc.get())
         recursive = self.var_recursive.get()
         workers = max(1, min(int(self.var_workers.get()), 5))
         dry = self.var_dry.get()
+        watch = self.var_watch.get() and not dry
+        mirror = self.var_mirror.get()
 
         root = Path(directory).expanduser().resolve()
         if not root.is_dir():
@@ -422,7 +409,11 @@ class SyncGUI(tk.Tk):
         self._save_settings()
 
         self.worker_thread = threading.Thread(
-            target=self._worker, args=(user, pw, files, dry, workers), daemon=True
+            target=self._worker, args=(user, pw, files, dry, workers),
+            kwargs={"root": root, "mirror": mirror, "watch": (include, exclude, recursive) if watch else None,
+                    "daemon_job": {"dir": str(root), "include": self.var_inc.get(), "exclude": self.var_exc.get(),
+                                   "recursive": recursive, "mirror": mirror}},
+            daemon=True
         )
         self.worker_thread.start()
 
@@ -437,12 +428,21 @@ class SyncGUI(tk.Tk):
         self.prog.configure(value=self.progress_done)
         self.lbl_status.configure(text=f"{self.progress_done}/{self.progress_total} Dateien")
 
-    def _worker(self, user, pw, files, dry, workers):
+    def _worker(self, user, pw, files, dry, workers, root=None, mirror=False, watch=None, daemon_job=None):
         t0 = time.time()
         ok = 0
         fail = 0
 
         try:
+            if daemon_job and not dry and not watch:
+                # Läuft ein sync_daemon.py, übernimmt er Login, Pool und Upload-Queue
+                from sync_daemon import DaemonClient
+
+                client = DaemonClient.find()
+                if client is not None:
+                    ok, fail = self._daemon_worker(client, user, pw, daemon_job)
+                    return
+
             self._log("→ Login…")
             session = upload.create_session(user, pw)
             self._log("✓ Login ok.")
@@ -456,50 +456,86 @@ class SyncGUI(tk.Tk):
                     self._bump_progress()
                 return
 
-            lock = threading.Lock()
-
-            def do_one(p: Path):
-                nonlocal ok, fail
-                if not self.running:
-                    return
-                try:
-                    res = upload.upload_with_session(session, str(p))
-                    with lock:
-                        ok += 1
-                        self._log(f"✓ {p.name} ({res['mime']}, {human_bytes(res['size'])})")
-                except Exception as e:
-                    with lock:
-                        fail += 1
-                        self._log(f"✗ {p.name} → {e}")
-                finally:
-                    self._bump_progress()
-
-            if workers == 1:
-                for p in files:
-                    if not self.running:
-                        break
-                    do_one(p)
-            else:
-                # Simple Thread-Pool
-                it = iter(files)
-
-                def feeder():
-                    for p in it:
-                        if not self.running:
-                            break
-                        do_one(p)
-
-                threads = [threading.Thread(target=feeder, daemon=True) for _ in range(workers)]
-                for t in threads:
-                    t.start()
-                for t in threads:
-                    t.join()
+            dirs = None
+            if mirror:
+                dirs = RemoteDirs(session, root)
+                dirs.ensure(files, workers=workers)
+                if dirs.created or dirs.found:
+                    self._log(f"✓ Ordner: {dirs.created} angelegt, {dirs.found} gefunden")
+            parent_for = dirs.parent_for if dirs else None
+            refresh_parent = dirs.refresh_parent if dirs else None
+
+            def on_result(p, res, err):
+                if err is None:
+                    self._log(f"✓ {p.name} ({res['mime']}, {human_bytes(res['size'])})")
+                else:
+                    self._log(f"✗ {p.name} → {err}")
+                self._bump_progress()
+
+            ok, fail = upload_files(
+                session, files, workers=workers, on_result=on_result, should_run=lambda: self.running,
+                parent_for=parent_for, refresh_parent=refresh_parent,
+            )
+
+            if watch and self.running:
+                from watch import Watcher
+
+                include, exclude, recursive = watch
+                watcher = Watcher(root, include, exclude, recursive=recursive)
+                self._log(f"\nBeobachte Ordner ({watcher.backend})… Stop beendet.")
+
+                def on_ready(paths):
+                    nonlocal ok, fail
+                    self.progress_total += len(paths)
+                    self.prog.configure(maximum=self.progress_total)
+                    if dirs:
+                        dirs.ensure(paths, workers=workers)
+                    n_ok, n_fail = upload_files(
+                        session, paths, workers=workers, on_result=on_result, should_run=lambda: self.running,
+                        parent_for=parent_for, refresh_parent=refresh_parent,
+                    )
+                    ok += n_ok
+                    fail += n_fail
+
+                watcher.run(on_ready, should_run=lambda: self.running)
 
         finally:
             dt = time.time() - t0
             self._log(f"\nFertig: {ok} ok, {fail} fail, in {dt:.1f}s")
             self._set_running(False)
 
+    def _daemon_worker(self, client, user, pw, daemon_job):
+        from sync_daemon import DaemonError
+
+        try:
+            job = client.submit(user=user, password=pw, **daemon_job)
+        except DaemonError as e:
+            self._log(f"✗ Daemon → {e}")
+            return 0, 0
+        self._log(f"→ Job {job['id']} an Daemon übergeben.")
+
+        def on_event(ev):
+            if ev["event"] == "file":
+                name = Path(ev["path"]).name
+                if ev["ok"]:
+                    self._log(f"✓ {name} ({ev['mime']}, {human_bytes(ev['size'])})")
+                else:
+                    self._log(f"✗ {name} → {ev['error']}")
+                self._bump_progress()
+            elif ev["event"] == "job" and ev.get("error"):
+                self._log(f"✗ {ev['error']}")
+
+        try:
+            final = client.follow(job["id"], on_event, should_run=lambda: self.running)
+            if final["state"] not in ("done", "cancelled", "failed"):
+                # Stop gedrückt → Job im Daemon abbrechen
+                client.control(job["id"], "cancel")
+                final = client.follow(job["id"], on_event)
+        except DaemonError as e:
+            self._log(f"✗ Daemon → {e}")
+            return 0, 0
+        return final["ok"], final["fail"]
+
     # ---- Settings ----
     def _save_settings(self):
         data = {
@@ -510,6 +546,8 @@ class SyncGUI(tk.Tk):
             "recursive": self.var_recursive.get(),
             "workers": int(self.var_workers.get()),
             "dry": self.var_dry.get(),
+            "watch": self.var_watch.get(),
+            "mirror": self.var_mirror.get(),
         }
         try:
             SETTINGS_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -527,6 +565,8 @@ class SyncGUI(tk.Tk):
                 self.var_recursive.set(bool(data.get("recursive", True)))
                 self.var_workers.set(int(data.get("workers", 2)))
                 self.var_dry.set(bool(data.get("dry", False)))
+                self.var_watch.set(bool(data.get("watch", False)))
+                self.var_mirror.set(bool(data.get("mirror", True)))
                 self._update_count_label()
         except Exception:
             pass
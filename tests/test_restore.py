@@ -0,0 +1,165 @@
+# test_restore.py – restore.py gegen einen lokalen Ersatz-Server
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests
+
+import restore
+import upload
+
+CHUNK = 1024
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Liefert /fileStorage, /files/file (Redirect) und /blob/<id> mit einstellbarem Range-Verhalten."""
+
+    protocol_version = "HTTP/1.1"
+    mode = "ok"          # ok | short | tail_short (erst ab 3. Range kurz) | norange
+    tree = {}            # parent -> [entry]
+    blobs = {}           # id -> bytes
+    gets = {}            # id -> Anzahl Blob-Requests
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        if u.path == "/fileStorage":
+            body = json.dumps(self.tree.get(q.get("parent"), [])).encode()
+            return self._send(200, body, {"Content-Type": "application/json"})
+        if u.path == "/files/file":
+            return self._send(302, headers={"Location": f"http://127.0.0.1:{self.server.server_port}/blob/{q['file']}"})
+        if u.path.startswith("/blob/"):
+            fid = u.path.rsplit("/", 1)[1]
+            StandIn.gets[fid] = StandIn.gets.get(fid, 0) + 1
+            data = self.blobs[fid]
+            rng = self.headers.get("Range")
+            if not rng or self.mode == "norange":
+                return self._send(200, data)
+            start, end = (int(x) for x in rng.split("=")[1].split("-"))
+            part = data[start:end + 1]
+            if self.mode == "short" or (self.mode == "tail_short" and start >= 3 * CHUNK):
+                part = part[:100]
+            return self._send(206, part, {"Content-Range": f"bytes {start}-{start + len(part) - 1}/{len(data)}"})
+        self._send(404)
+
+
+class RestoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.srv = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+        threading.Thread(target=cls.srv.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.srv.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.srv.shutdown()
+        cls.srv.server_close()
+
+    def setUp(self):
+        self._saved = (upload.BASE, upload.API_BASE, restore.CHUNK_SIZE, restore.LARGE_FILE)
+        upload.BASE = upload.API_BASE = self.base
+        restore.CHUNK_SIZE, restore.LARGE_FILE = CHUNK, 2 * CHUNK
+        big, small = os.urandom(5 * CHUNK + 17), os.urandom(300)
+        StandIn.blobs = {"big": big, "small": small}
+        StandIn.tree = {
+            None: [{"_id": "d1", "name": "sub", "isDirectory": True},
+                   {"_id": "big", "name": "big.bin", "size": len(big)}],
+            "d1": [{"_id": "small", "name": "small.txt", "size": len(small)}],
+        }
+        StandIn.gets = {}
+        StandIn.mode = "ok"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / "dest"
+
+    def tearDown(self):
+        upload.BASE, upload.API_BASE, restore.CHUNK_SIZE, restore.LARGE_FILE = self._saved
+        self.tmp.cleanup()
+
+    def restore(self, hashes=None):
+        session = requests.Session()
+        results = []
+        unsafe = []
+        tree = restore.list_tree(session, on_unsafe=lambda rel, e: unsafe.append(rel))
+        files = [restore.RemoteFile(rel, e, self.dest, (hashes or {}).get(rel)) for rel, e in tree]
+        self.files = {rf.rel: rf for rf in files}
+        counts = restore.Restorer(session, workers=4).run(files, lambda rf, err, sk: results.append((rf.rel, err)))
+        return counts, results, unsafe
+
+    def test_restores_tree(self):
+        (ok, fail, skipped), _, _ = self.restore()
+        self.assertEqual((ok, fail, skipped), (2, 0, 0))
+        self.assertEqual((self.dest / "big.bin").read_bytes(), StandIn.blobs["big"])
+        self.assertEqual((self.dest / "sub" / "small.txt").read_bytes(), StandIn.blobs["small"])
+        self.assertEqual(list(self.dest.rglob("*.part*")), [])
+        # Zweiter Lauf: alles schon da
+        self.assertEqual(self.restore()[0], (0, 0, 2))
+
+    def test_short_ranges_fail(self):
+        StandIn.mode = "short"
+        (ok, fail, _), results, _ = self.restore()
+        self.assertEqual((ok, fail), (1, 1))
+        err = dict(results)["big.bin"]
+        self.assertIn("Unvollständig", str(err))
+        self.assertFalse((self.dest / "big.bin").exists())
+
+    def test_resume_after_failure(self):
+        # Erster Lauf: Ranges 0–2 kommen an, 3 und 4 sind zu kurz (5 hat nur 17 Bytes und bleibt ganz)
+        StandIn.mode = "tail_short"
+        (ok, fail, _), _, _ = self.restore()
+        self.assertEqual((ok, fail), (1, 1))
+        chunks = self.files["big.bin"].chunks
+        self.assertEqual(chunks, 6)
+        state = json.loads((self.dest / "big.bin.part.json").read_text(encoding="utf-8"))
+        self.assertEqual(state["done"], [0, 1, 2, 5])
+
+        # Zweiter Lauf: nur die fehlenden Ranges werden geladen
+        StandIn.mode = "ok"
+        StandIn.gets = {}
+        (ok, fail, skipped), _, _ = self.restore()
+        self.assertEqual((ok, fail, skipped), (1, 0, 1))
+        self.assertTrue(self.files["big.bin"].resumed)
+        self.assertEqual(StandIn.gets["big"], 2)
+        self.assertEqual((self.dest / "big.bin").read_bytes(), StandIn.blobs["big"])
+
+    def test_server_ignores_range(self):
+        StandIn.mode = "norange"
+        big = StandIn.blobs["big"]
+        (ok, fail, _), results, _ = self.restore({"big.bin": hashlib.sha256(big).hexdigest()})
+        self.assertEqual((ok, fail), (2, 0))
+        self.assertEqual([rel for rel, _ in results].count("big.bin"), 1)
+        self.assertEqual((self.dest / "big.bin").read_bytes(), big)
+        # Höchstens eine Range lädt die ganze Datei, die übrigen brechen ohne Body ab
+        self.assertLessEqual(StandIn.gets["big"], restore.RemoteFile("big.bin", {"size": len(big)}, self.dest).chunks)
+
+    def test_rejects_unsafe_names(self):
+        StandIn.tree[None] += [{"_id": "small", "name": "..", "isDirectory": True},
+                               {"_id": "small", "name": "../evil.txt", "size": 300}]
+        _, _, unsafe = self.restore()
+        self.assertEqual(sorted(unsafe), ["..", "../evil.txt"])
+        self.assertFalse((Path(self.tmp.name) / "evil.txt").exists())
+        with self.assertRaises(ValueError):
+            restore.RemoteFile("a/../../x", {"size": 1}, self.dest)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# test_scheduler.py – profiles.Scheduler: Pause/Fortsetzen/Abbruch rund um den letzten Upload
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import profiles
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        (root / "a.txt").write_text("a")
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.uploaded = []
+
+        def fake_upload(session, p, parent_id, data=None, refresh_parent=None):
+            self.started.set()
+            self.release.wait(5)
+            self.uploaded.append(p.name)
+            return {"ok": True, "name": p.name, "size": 1, "mime": "text/plain", "sha256": ""}
+
+        self._saved = profiles.upload_to_parent
+        profiles.upload_to_parent = fake_upload
+        self.sched = profiles.Scheduler(workers=2)
+        self.job = profiles.Job("t", {"dir": str(root), "mirror": False})
+        self.sched.submit(self.job, session=object())
+        self.assertTrue(self.started.wait(5))
+
+    def tearDown(self):
+        self.release.set()
+        self.sched.shutdown()
+        profiles.upload_to_parent = self._saved
+        self.tmp.cleanup()
+
+    def test_pause_during_last_upload_then_resume(self):
+        self.sched.pause(self.job)
+        self.release.set()
+        # Upload fertig, Quelle leer, Job pausiert: noch nicht beendet
+        self.assertFalse(self.sched.wait([self.job], timeout=0.3))
+        self.sched.resume(self.job)
+        self.assertTrue(self.sched.wait([self.job], timeout=2))
+        self.assertEqual((self.job.state, self.job.ok), ("done", 1))
+
+    def test_resume_before_upload_finishes(self):
+        self.sched.pause(self.job)
+        self.sched.resume(self.job)
+        self.release.set()
+        self.assertTrue(self.sched.wait([self.job], timeout=2))
+        self.assertEqual((self.job.state, self.job.ok), ("done", 1))
+
+    def test_cancel_during_last_upload(self):
+        self.sched.cancel(self.job)
+        # Der laufende Upload darf noch zu Ende gehen, erst danach ist der Job beendet
+        self.assertFalse(self.job.finished_event.is_set())
+        self.release.set()
+        self.assertTrue(self.sched.wait([self.job], timeout=2))
+        self.assertEqual(self.job.state, "cancelled")
+        self.assertEqual(self.uploaded, ["a.txt"])
+
+    def test_cancel_while_paused(self):
+        self.sched.pause(self.job)
+        self.release.set()
+        self.assertFalse(self.sched.wait([self.job], timeout=0.3))
+        self.sched.cancel(self.job)
+        self.assertTrue(self.sched.wait([self.job], timeout=2))
+        self.assertEqual(self.job.state, "cancelled")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,25 +2,80 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import os
 import sys
 import time
 import json
 import re
+import base64
+import hashlib
+import threading
 from urllib.parse import urlparse, parse_qsl
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 import mimetypes
 
 
-BASE = "https://brandenburg.cloud"
+# Per Umgebung überschreibbar (z. B. lokaler Test-Server)
+BASE = os.environ.get("BRB_BASE", "https://brandenburg.cloud")
+API_BASE = os.environ.get("BRB_API_BASE", "https://api.brandenburg.cloud")
+
+# Gespeicherte Login-Cookies (pro Konto), siehe save_session_cache()
+SESSION_CACHE_FILE = Path.home() / ".brb_session.json"
+
+# requests-Response-Hooks für alle Requests dieses Moduls (z. B. http_trace.TraceRecorder)
+RESPONSE_HOOKS = []
+
+# Verbindungen pro Host, die offen gehalten werden (≥ Anzahl paralleler Worker)
+POOL_SIZE = 10
+_storage = None
+_storage_lock = threading.Lock()
+
+def mount_pool(session, size=None):
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size or POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+def configure_pools(size: int):
+    """Poolgröße für alle danach erzeugten Sessions (inkl. Speicher-Session) setzen."""
+    global POOL_SIZE, _storage
+    with _storage_lock:
+        POOL_SIZE = max(1, size)
+        if _storage is not None:
+            mount_pool(_storage)
+
+def storage_session() -> requests.Session:
+    """
+    Gemeinsame Session (Keep-Alive-Pool) für signierte Speicher-URLs, ohne Cloud-Cookies.
+    Alle Uploads und Downloads teilen sich diese Verbindungen.
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = requests.Session()
+            _storage.hooks["response"] = RESPONSE_HOOKS
+            mount_pool(_storage)
+        return _storage
 
 def die(msg):
     print(msg, file=sys.stderr)
     sys.exit(1)
 
+_CSRF_META_RE = re.compile(
+    rb'<meta[^>]*name=["\']csrfToken["\'][^>]*content=["\']([^"\']+)["\']', re.IGNORECASE
+)
+
 def get_csrf_from_html(html_bytes):
+    # Schneller Weg ohne bs4 (spart den Import beim Start)
+    if isinstance(html_bytes, str):
+        html_bytes = html_bytes.encode("utf-8", "replace")
+    m = _CSRF_META_RE.search(html_bytes)
+    if m:
+        return m.group(1).decode("utf-8", "replace")
+    # Fallback: richtiger HTML-Parser (z. B. andere Attribut-Reihenfolge)
     try:
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_bytes, "html.parser")
         m = soup.find("meta", attrs={"name": "csrfToken"})
         if m and m.get("content"):
@@ -29,9 +84,21 @@ def get_csrf_from_html(html_bytes):
         pass
     return None
 
+def is_login_page(r) -> bool:
+    """Erkennt, ob eine Antwort (nach Redirects) auf der Login-Seite gelandet ist."""
+    if urlparse(r.url).path.rstrip("/") == "/login":
+        return True
+    return b"Login - Schul-Cloud" in r.content
+
 def must_get_csrf(session, url="/"):
+    gen = getattr(session, "login_generation", 0)
     r = session.get(BASE + url, allow_redirects=True)
     r.raise_for_status()
+    # Gecachte Session abgelehnt? Dann einmal neu einloggen und wiederholen.
+    if isinstance(session, CloudSession) and url != "/" and is_login_page(r):
+        session.relogin(gen)
+        r = session.get(BASE + url, allow_redirects=True)
+        r.raise_for_status()
     token = get_csrf_from_html(r.content)
     if not token:
         die("Konnte CSRF-Token nicht aus HTML extrahieren.")
@@ -135,7 +202,7 @@ def s3_put(presigned_url, file_path, allowed_headers=None):
     with open(file_path, "rb") as f:
         data = f.read()
 
-    r = requests.put(presigned_url, data=data, headers=headers)
+    r = storage_session().put(presigned_url, data=data, headers=headers)
     if r.status_code not in (200, 201, 204):
         print("S3 PUT fehlgeschlagen:", r.status_code)
         print(r.text[:500])
@@ -174,8 +241,24 @@ def main():
     ap.add_argument("--file", required=True, help="Pfad zur Datei")
     ap.add_argument("--type", default=None, help="MIME-Type (z. B. image/png)")
     ap.add_argument("--name", default=None, help="Anzeigename (optional; default=Dateiname)")
+    ap.add_argument("--record-trace", default=None,
+                    help="HTTP-Verkehr geschwärzt in diese Datei aufzeichnen (für http_trace.py)")
     args = ap.parse_args()
 
+    recorder = None
+    if args.record_trace:
+        from http_trace import start_recording
+        recorder = start_recording(args.record_trace)
+    try:
+        _upload_one(args)
+    finally:
+        if recorder:
+            from http_trace import stop_recording
+            stop_recording(recorder)
+
+
+def _upload_one(args):
+
     p = Path(args.file)
     if not p.is_file():
         die(f"Datei nicht gefunden: {p}")
@@ -197,6 +280,7 @@ def main():
     display_name = args.name or p.name
 
     with requests.Session() as s:
+        s.hooks["response"] = RESPONSE_HOOKS
         s.headers.update({
             "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
                           "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
@@ -218,48 +302,234 @@ def main():
 
         print("✅ Fertig. Datei registriert.")
 
-def create_session(username: str, password: str) -> requests.Session:
-    """Einmal einloggen und Session zurückgeben."""
-    s = requests.Session()
-    s.headers.update({
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                      "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
-    })
+class CloudSession(requests.Session):
+    """
+    requests.Session, die ihre Zugangsdaten kennt und sich bei abgelehnten
+    (z. B. abgelaufenen gecachten) Cookies selbst neu einloggt.
+    """
 
-    # 1) CSRF von /login (oder /) holen
-    r = s.get(f"{BASE}/login", allow_redirects=True)
-    r.raise_for_status()
-    csrf = get_csrf_from_html(r.text)  # <-- hier statt _extract_csrf_from_html
-    if not csrf:
-        # Fallback über Startseite probieren
-        r2 = s.get(f"{BASE}/", allow_redirects=True)
-        r2.raise_for_status()
-        csrf = get_csrf_from_html(r2.text)
-    if not csrf:
-        die("CSRF-Token beim Login nicht gefunden.")
-
-    # 2) Login-POST
-    data = {
-        "redirect": "",
-        "username": username,
-        "password": password,
-        "schoolId": "",
-        "_csrf": csrf,
+    def __init__(self, username: str, password: str, use_cache: bool = True):
+        super().__init__()
+        self.hooks["response"] = RESPONSE_HOOKS
+        mount_pool(self)
+        self.headers.update({
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                          "(KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+        })
+        self.username = username
+        self._password = password
+        self.use_cache = use_cache
+        self.login_generation = 0
+        self._login_lock = threading.Lock()
+
+    def login(self):
+        """Voller Login (GET /login, POST /login); prüft nur die ohnehin geladene POST-Antwort."""
+        self.cookies.clear()
+        # 1) CSRF von /login (oder /) holen
+        r = self.get(f"{BASE}/login", allow_redirects=True)
+        r.raise_for_status()
+        csrf = get_csrf_from_html(r.content)
+        if not csrf:
+            # Fallback über Startseite probieren
+            r2 = self.get(f"{BASE}/", allow_redirects=True)
+            r2.raise_for_status()
+            csrf = get_csrf_from_html(r2.content)
+        if not csrf:
+            die("CSRF-Token beim Login nicht gefunden.")
+
+        # 2) Login-POST
+        data = {
+            "redirect": "",
+            "username": self.username,
+            "password": self._password,
+            "schoolId": "",
+            "_csrf": csrf,
+        }
+        r = self.post(f"{BASE}/login", data=data, allow_redirects=True)
+        r.raise_for_status()
+
+        # 3) Landet der Redirect wieder auf der Login-Seite, war der Login falsch
+        if is_login_page(r):
+            die("Login fehlgeschlagen: Server zeigt wieder die Login-Seite.")
+
+        self.login_generation += 1
+        if self.use_cache:
+            save_session_cache(self)
+
+    def relogin(self, seen_generation: int):
+        """Neu einloggen – aber nur einmal, auch wenn mehrere Threads gleichzeitig abgelehnt wurden."""
+        with self._login_lock:
+            if self.login_generation == seen_generation:
+                self.login()
+
+
+def account_key(username: str) -> str:
+    return hashlib.sha256(f"{BASE}|{username}".encode("utf-8")).hexdigest()
+
+def _read_session_cache() -> dict:
+    try:
+        return json.loads(SESSION_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+def _write_session_cache(data: dict):
+    """Schreibt atomar und nur für den eigenen Benutzer lesbar (0600)."""
+    tmp = SESSION_CACHE_FILE.with_name(SESSION_CACHE_FILE.name + ".tmp")
+    try:
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, SESSION_CACHE_FILE)
+    except OSError:
+        pass
+
+def save_session_cache(session: CloudSession):
+    """Speichert die Session-Cookies (kein Passwort)."""
+    data = _read_session_cache()
+    data[account_key(session.username)] = {
+        "saved": time.time(),
+        "cookies": [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+             "expires": c.expires, "secure": c.secure}
+            for c in session.cookies
+        ],
+    }
+    _write_session_cache(data)
+
+def load_session_cache(session: CloudSession) -> bool:
+    entry = _read_session_cache().get(account_key(session.username))
+    if not entry:
+        return False
+    now = time.time()
+    n = 0
+    for c in entry.get("cookies", []):
+        if c.get("expires") and c["expires"] < now:
+            continue
+        session.cookies.set(c["name"], c["value"], domain=c.get("domain") or "",
+                            path=c.get("path") or "/", expires=c.get("expires"), secure=c.get("secure", False))
+        n += 1
+    return n > 0
+
+def forget_session(username: str):
+    data = _read_session_cache()
+    if data.pop(account_key(username), None) is not None:
+        _write_session_cache(data)
+
+
+def create_session(username: str, password: str, use_cache: bool = True) -> requests.Session:
+    """
+    Session zurückgeben. Mit Cache werden gespeicherte Cookies ohne Request übernommen;
+    geprüft wird erst beim ersten echten Aufruf (must_get_csrf), voller Login nur bei Ablehnung.
+    """
+    s = CloudSession(username, password, use_cache=use_cache)
+    if use_cache and load_session_cache(s):
+        return s
+    s.login()
+    return s
+
+
+def _jwt(session):
+    # Login setzt ein "jwt"-Cookie; die API erwartet es als Bearer-Token
+    for c in session.cookies:
+        if c.name == "jwt":
+            return c.value
+    return None
+
+def jwt_claims(session) -> dict:
+    token = _jwt(session)
+    if not token or token.count(".") != 2:
+        return {}
+    payload = token.split(".")[1]
+    try:
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except ValueError:
+        return {}
+
+def api_get(session, path, params=None):
+    """GET gegen die JSON-API; bei 401 (Session abgelaufen) einmal neu einloggen."""
+    for attempt in (0, 1):
+        gen = getattr(session, "login_generation", 0)
+        token = _jwt(session)
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        r = session.get(API_BASE + path, params=params, headers=headers)
+        if r.status_code == 401 and attempt == 0 and isinstance(session, CloudSession):
+            session.relogin(gen)
+            continue
+        r.raise_for_status()
+        return r.json()
+
+def list_remote(session, parent_id=None) -> list:
+    """Einträge (Dateien und Ordner) in "Meine Dateien" bzw. im Ordner parent_id."""
+    params = {"owner": jwt_claims(session).get("userId", "")}
+    if parent_id:
+        params["parent"] = parent_id
+    j = api_get(session, "/fileStorage", params)
+    return j.get("data", []) if isinstance(j, dict) else j
+
+def download_url(session, file_id) -> str:
+    """Signierte Download-URL für eine Datei (der Client leitet dorthin weiter)."""
+    for attempt in (0, 1):
+        gen = getattr(session, "login_generation", 0)
+        r = session.get(f"{BASE}/files/file", params={"file": file_id, "download": "true"},
+                        allow_redirects=False)
+        if r.is_redirect:
+            loc = r.headers.get("Location", "")
+            if urlparse(loc).path.rstrip("/") == "/login":
+                if attempt == 0 and isinstance(session, CloudSession):
+                    session.relogin(gen)
+                    continue
+                raise RuntimeError("Download abgelehnt: nicht eingeloggt.")
+            return loc
+        r.raise_for_status()
+        if "application/json" in r.headers.get("Content-Type", ""):
+            j = r.json()
+            url = j.get("url") or (j.get("signedUrl") or {}).get("url")
+            if url:
+                return url
+        raise RuntimeError(f"Keine Download-URL für {file_id} (HTTP {r.status_code}).")
+
+def create_directory(session, name, parent_id=None, csrf=None) -> str:
+    """Legt einen Ordner an und gibt seine ID zurück."""
+    csrf = csrf or must_get_csrf(session, "/files/my/")
+    headers = {
+        "X-Requested-With": "XMLHttpRequest",
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "csrf-token": csrf,
+        "Referer": f"{BASE}/files/my/",
     }
-    r = s.post(f"{BASE}/login", data=data, allow_redirects=True)
+    data = {"name": name}
+    if parent_id:
+        data["parent"] = parent_id
+    r = session.post(f"{BASE}/files/directory", data=data, headers=headers)
     r.raise_for_status()
+    j = r.json()
+    dir_id = j.get("_id") or j.get("id")
+    if not dir_id:
+        raise RuntimeError(f"Unerwartete Antwort beim Ordner-Anlegen: {j}")
+    return dir_id
 
-    # 3) Verifizieren, dass wir eingeloggt sind (Dashboard darf keine Login-Seite sein)
-    dash = s.get(f"{BASE}/dashboard", allow_redirects=True)
-    dash.raise_for_status()
-    if b"Login - Schul-Cloud" in dash.content or "Login - Schul-Cloud" in dash.text:
-        die("Login fehlgeschlagen: Dashboard zeigt Login-Seite.")
 
-    return s
+class ParentNotFound(RuntimeError):
+    """Der Server lehnt den Zielordner ab (z. B. online gelöscht)."""
+
+    def __init__(self, parent_id, status):
+        super().__init__(f"Zielordner {parent_id} abgelehnt (HTTP {status})")
+        self.parent_id = parent_id
+
+
+def _check_parent(r, parent_id):
+    if parent_id and r.status_code in (400, 403, 404):
+        raise ParentNotFound(parent_id, r.status_code)
+    r.raise_for_status()
 
 
-def upload_with_session(session: requests.Session, file_path: str) -> dict:
-    """Nutzt die bestehende Session, macht INIT → S3 PUT → fileModel POST."""
+def upload_with_session(session: requests.Session, file_path: str, parent_id=None, data=None) -> dict:
+    """
+    Nutzt die bestehende Session, macht INIT → S3 PUT → fileModel POST.
+    parent_id: Zielordner (None = "Meine Dateien").
+    data: bereits gelesener Dateiinhalt (z. B. von prefetch.Prefetcher), sonst wird gelesen.
+    """
     p = Path(file_path)
     if not p.is_file():
         raise FileNotFoundError(p)
@@ -278,22 +548,32 @@ def upload_with_session(session: requests.Session, file_path: str) -> dict:
         "Referer": f"{BASE}/files/my/",
     }
     init_data = {"type": mime, "filename": p.name}
+    if parent_id:
+        init_data["parent"] = parent_id
     r = session.post(f"{BASE}/files/file", data=init_data, headers=init_headers)
-    r.raise_for_status()
+    _check_parent(r, parent_id)
     j = r.json()
     su = j.get("signedUrl") or {}
-    presigned_url = su.get("url")
-    signed_headers = su.get("header") or {}
-    storage = signed_headers.get("x-amz-meta-flat-name")
-    if not storage and presigned_url:
-        from urllib.parse import urlparse, parse_qsl
-        storage = dict(parse_qsl(urlparse(presigned_url).query)).get("x-amz-meta-flat-name")
+    if su:
+        presigned_url = su.get("url")
+        signed_headers = su.get("header") or {}
+        storage = signed_headers.get("x-amz-meta-flat-name")
+        if not storage and presigned_url:
+            storage = dict(parse_qsl(urlparse(presigned_url).query)).get("x-amz-meta-flat-name")
+    else:
+        # Alter Branch (wie init_file): URL + storageFileName, Header aus der URL-Query
+        presigned_url = j.get("url") or j.get("uploadUrl")
+        storage = j.get("storageFileName") or j.get("storage") or j.get("key")
+        signed_headers = extract_allowed_s3_headers_from_url(presigned_url) if presigned_url else {}
     if not presigned_url or not storage:
         raise RuntimeError(f"Unerwartetes INIT-JSON: {j}")
 
     # S3 PUT mit GENAU den signierten Headern
-    with open(p, "rb") as f:
-        put = requests.put(presigned_url, data=f.read(), headers=signed_headers)
+    if data is None:
+        with open(p, "rb") as f:
+            data = f.read()
+    body = data
+    put = storage_session().put(presigned_url, data=body, headers=signed_headers)
     if put.status_code not in (200, 201, 204):
         raise RuntimeError(f"S3 PUT failed {put.status_code}: {put.text[:200]}")
 
@@ -307,12 +587,16 @@ def upload_with_session(session: requests.Session, file_path: str) -> dict:
     fm_data = {
         "name": p.name,
         "type": mime,
-        "size": p.stat().st_size,
+        "size": len(body),
         "storageFileName": storage,
     }
+    if parent_id:
+        fm_data["parent"] = parent_id
     r = session.post(f"{BASE}/files/fileModel", data=fm_data, headers=fm_headers)
-    r.raise_for_status()
-    return {"ok": True, "name": p.name, "size": p.stat().st_size, "mime": mime}
+    _check_parent(r, parent_id)
+    # sha256 für spätere Prüfung beim Wiederherstellen (restore.py --manifest)
+    return {"ok": True, "name": p.name, "size": len(body), "mime": mime,
+            "sha256": hashlib.sha256(body).hexdigest()}
 
 if __name__ == "__main__":
     main()
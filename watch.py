@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# watch.py – Ordner beobachten (inotify unter Linux, sonst Polling)
+import os
+import sys
+import time
+import struct
+import select
+import ctypes
+import ctypes.util
+from pathlib import Path
+
+from sync_core import name_matches
+
+# inotify-Konstanten (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT_HDR = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class Watcher:
+    """
+    Meldet neue/geänderte Dateien unterhalb von root, sobald sie fertig geschrieben sind.
+
+    Ereignisse pro Datei werden gesammelt (debounce): eine Datei gilt als fertig, wenn sie
+    geschlossen wurde (IN_CLOSE_WRITE / IN_MOVED_TO) und danach `debounce` Sekunden Ruhe war.
+    Ohne Close-Ereignis (Polling, mmap-Schreiber) reicht eine Ruhezeit von `settle` Sekunden.
+    Ohne ausstehende Dateien blockiert run() ohne Timeout → keine CPU im Leerlauf.
+    """
+
+    def __init__(self, root: Path, include=None, exclude=None, recursive=True,
+                 debounce=2.0, settle=10.0, poll_interval=5.0, force_polling=False):
+        self.root = Path(root)
+        self.include = include or []
+        self.exclude = exclude or []
+        self.recursive = recursive
+        self.debounce = debounce
+        self.settle = max(settle, debounce)
+        self.poll_interval = poll_interval
+        self._libc = None if force_polling else _load_inotify()
+        self.backend = "inotify" if self._libc else "polling"
+        # path -> [letztes Ereignis (monotonic), geschlossen?]
+        self._pending = {}
+        self._fd = -1
+        self._wd_to_dir = {}
+
+    # ---- gemeinsame Logik ----
+    def _wanted(self, p: Path) -> bool:
+        if not name_matches(p.name, self.include, self.exclude):
+            return False
+        if not self.recursive and p.parent != self.root:
+            return False
+        return True
+
+    def _touch(self, p: Path, closed: bool):
+        if not self._wanted(p):
+            return
+        entry = self._pending.get(p)
+        if entry is None:
+            self._pending[p] = [time.monotonic(), closed]
+        else:
+            entry[0] = time.monotonic()
+            # Ein Schreiben nach dem Schließen heißt: Datei ist wieder offen → wieder `settle`
+            entry[1] = closed
+
+    def _take_ready(self):
+        now = time.monotonic()
+        ready = []
+        for p, (last, closed) in list(self._pending.items()):
+            quiet = now - last
+            if quiet >= (self.debounce if closed else self.settle):
+                del self._pending[p]
+                if p.is_file():
+                    ready.append(p)
+        return sorted(ready)
+
+    def _next_timeout(self):
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        waits = [(self.debounce if closed else self.settle) - (now - last)
+                 for last, closed in self._pending.values()]
+        return max(0.0, min(waits))
+
+    def run(self, on_ready, should_run=lambda: True, stop_check=1.0):
+        """
+        Ruft on_ready(list[Path]) für jede fertige Gruppe von Dateien auf, bis should_run() False ist.
+        stop_check=None blockiert im Leerlauf ohne Timeout (Abbruch dann nur per Signal).
+        """
+        if self._libc:
+            try:
+                self._run_inotify(on_ready, should_run, stop_check)
+                return
+            except OSError:
+                # z. B. max_user_watches erreicht → Polling
+                self._close()
+                self.backend = "polling"
+        self._run_polling(on_ready, should_run)
+
+    # ---- inotify ----
+    def _add_watch(self, d: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(d)), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(d))
+        self._wd_to_dir[wd] = d
+
+    def _add_tree(self, d: Path, mark_existing=False):
+        self._add_watch(d)
+        if not self.recursive:
+            return
+        for dirpath, dirnames, filenames in os.walk(d):
+            dirnames[:] = [n for n in dirnames if not n.startswith(".")]
+            for n in dirnames:
+                self._add_watch(Path(dirpath) / n)
+            if mark_existing:
+                # Dateien, die vor dem Watch im neuen Ordner angelegt wurden
+                for n in filenames:
+                    self._touch(Path(dirpath) / n, closed=False)
+
+    def _close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = -1
+        self._wd_to_dir.clear()
+
+    def _run_inotify(self, on_ready, should_run, stop_check):
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        try:
+            self._add_tree(self.root)
+            while should_run():
+                timeout = self._next_timeout()
+                # stop_check nur, damit should_run() regelmäßig geprüft wird (None = blockieren)
+                if stop_check is not None and (timeout is None or timeout > stop_check):
+                    timeout = stop_check
+                r, _, _ = select.select([self._fd], [], [], timeout)
+                if r:
+                    self._read_events(os.read(self._fd, 64 * 1024))
+                ready = self._take_ready()
+                if ready:
+                    on_ready(ready)
+        finally:
+            self._close()
+
+    def _read_events(self, buf: bytes):
+        off = 0
+        since = time.time() - self.settle
+        while off + _EVENT_HDR.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HDR.unpack_from(buf, off)
+            off += _EVENT_HDR.size
+            name = buf[off:off + length].rstrip(b"\0")
+            off += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Ereignisse verloren → kürzlich geänderte Dateien erneut prüfen
+                self._scan_recent(since)
+                continue
+            d = self._wd_to_dir.get(wd)
+            if d is None:
+                continue
+            if mask & IN_IGNORED:
+                self._wd_to_dir.pop(wd, None)
+                continue
+            if not name:
+                continue
+            p = d / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and not p.name.startswith("."):
+                    try:
+                        self._add_tree(p, mark_existing=True)
+                    except OSError:
+                        pass
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._pending.pop(p, None)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self._touch(p, closed=True)
+            elif mask & (IN_MODIFY | IN_CREATE):
+                self._touch(p, closed=False)
+
+    def _scan_recent(self, since: float):
+        it = self.root.rglob("*") if self.recursive else self.root.glob("*")
+        for p in it:
+            try:
+                if p.is_file() and p.stat().st_mtime >= since:
+                    self._touch(p, closed=False)
+            except OSError:
+                pass
+
+    # ---- Polling-Fallback ----
+    def _snapshot(self):
+        snap = {}
+        it = self.root.rglob("*") if self.recursive else self.root.glob("*")
+        for p in it:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            if os.path.isfile(p) and self._wanted(p):
+                snap[p] = (st.st_mtime_ns, st.st_size)
+        return snap
+
+    def _run_polling(self, on_ready, should_run):
+        known = self._snapshot()
+        while should_run():
+            timeout = self._next_timeout()
+            wait = self.poll_interval if timeout is None else min(self.poll_interval, max(timeout, 0.2))
+            time.sleep(wait)
+            snap = self._snapshot()
+            for p, sig in snap.items():
+                if known.get(p) != sig:
+                    self._touch(p, closed=False)
+            for p in set(known) - set(snap):
+                self._pending.pop(p, None)
+            known = snap
+            # Polling kennt kein Close → settle = Ruhezeit seit der letzten Änderung
+            ready = self._take_ready()
+            if ready:
+                on_ready(ready)